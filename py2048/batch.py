@@ -0,0 +1,204 @@
+"""Batches of 4x4 boards moved together with NumPy
+
+BoardBatch holds N boards as an (N, 4, 4) array of log2 exponents (0
+for an empty space) so that a move, a spawn or a legality check is a
+handful of array operations for the whole batch instead of a Python
+loop per board.  Moves look rows up in the tables from py2048.tables,
+so the results are the same as Board.move.
+
+Directions are given either by name or as an index into DIRS, and a
+move can use one direction for every board or an array with one
+direction per board.
+"""
+
+import numpy as np
+
+from py2048 import tables
+from py2048.board import GRID_SIZE, PROB_2, DIRS
+
+N_CELLS = GRID_SIZE[0] * GRID_SIZE[1]
+
+
+def direction_index(d):
+    """Converts a direction name, index or array of indices into
+    indices into DIRS"""
+    if isinstance(d, str):
+        return DIRS.index(d)
+    return d
+
+
+def legal_moves(exponents, out=None):
+    """The legality of every move of an (n, 4, 4) array of exponents,
+    see BoardBatch.possible_moves"""
+    t = tables.row_tables()
+    exponents = exponents.astype(np.int64)
+    rows = exponents.dot(tables.ROW_WEIGHTS)
+    cols = exponents.transpose(0, 2, 1).dot(tables.ROW_WEIGHTS)
+
+    if out is None:
+        legal = np.empty((len(exponents), len(DIRS)), dtype=bool)
+    else:
+        legal = out
+    legal[:, 0] = t.changed_left[rows].any(axis=1)
+    legal[:, 1] = t.changed_right[rows].any(axis=1)
+    legal[:, 2] = t.changed_left[cols].any(axis=1)
+    legal[:, 3] = t.changed_right[cols].any(axis=1)
+    return legal
+
+
+class BoardBatch:
+    """A batch of N 4x4 boards of the game 2048
+
+    Parameters
+    ----------
+    n : int
+        Number of boards in the batch
+    prob_2 : numeric in [0,1]
+        The probability of generating a 2 when a random tile is added
+    seed : int, np.random.Generator or None
+        Seed for the random number generator used to add tiles
+
+    Attributes
+    ----------
+    exponents : ndarray
+        (n, 4, 4) uint8 array of the tile exponents, 0 for empty spaces
+    score : ndarray
+        (n,) int64 array of the score of each game
+    prob_2 : numeric in [0,1]
+        Initialized probability of generating a 2
+    rng : np.random.Generator
+        Random number generator used to add tiles
+    """
+    def __init__(self, n, prob_2=PROB_2, seed=None):
+        self.exponents = np.zeros((n,) + GRID_SIZE, dtype=np.uint8)
+        self.score = np.zeros(n, dtype=np.int64)
+        self.prob_2 = prob_2
+        self.rng = np.random.default_rng(seed)
+
+        self.add_random_tile()
+        self.add_random_tile()
+
+    @classmethod
+    def from_grids(cls, grids, scores=None, prob_2=PROB_2, seed=None):
+        """Creates a batch from an (n, 4, 4) array of grids in the Board
+        layout (1s for blank spaces)"""
+        grids = np.asarray(grids)
+        batch = cls(0, prob_2, seed)
+        batch.exponents = tables.grid_exponents(grids).astype(np.uint8)
+        batch.score = np.zeros(len(grids), dtype=np.int64)
+        if scores is not None:
+            batch.score[:] = scores
+        return batch
+
+    def __len__(self):
+        return len(self.exponents)
+
+    @property
+    def grids(self):
+        """The boards as an (n, 4, 4) array in the Board layout"""
+        return np.where(self.exponents == 0, 1, 2.0 ** self.exponents)
+
+    def n_empty_tiles(self):
+        """Returns the number of empty tiles of each board"""
+        return np.sum(self.exponents == 0, axis=(1, 2))
+
+    def max_tile(self):
+        """Returns the value of the largest tile of each board"""
+        return 2 ** self.exponents.max(axis=(1, 2)).astype(np.int64)
+
+    def _move_subset(self, sel, d):
+        """Moves the boards picked by the boolean mask sel in the
+        direction index d"""
+        t = tables.row_tables()
+        exponents = self.exponents[sel]
+        if d >= 2:
+            exponents = exponents.transpose(0, 2, 1)
+        codes = exponents.astype(np.int64).dot(tables.ROW_WEIGHTS)
+
+        if d == 0 or d == 2:
+            moved = t.left_lines[codes]
+            changed = t.changed_left[codes].any(axis=1)
+        else:
+            moved = t.right_lines[codes]
+            changed = t.changed_right[codes].any(axis=1)
+
+        if d >= 2:
+            moved = moved.transpose(0, 2, 1)
+        self.exponents[sel] = moved
+        self.score[sel] += t.score[codes].sum(axis=1)
+        return changed
+
+    def move(self, d, mask=None):
+        """Moves the tiles of the boards.
+
+        Parameters
+        ----------
+        d : str, int or ndarray
+            The direction for every board, either a name from DIRS or an
+            index into DIRS, or an (n,) array with the direction index
+            for each board.  Boards with a negative index are not moved.
+        mask : ndarray or None
+            Only the boards where the (n,) boolean mask is True are moved
+
+        Returns : ndarray (n,) bool, True where the board changed
+        """
+        d = direction_index(d)
+        changed = np.zeros(len(self), dtype=bool)
+        for k in range(len(DIRS)):
+            if np.ndim(d) == 0:
+                if d != k:
+                    continue
+                sel = np.ones(len(self), dtype=bool)
+            else:
+                sel = np.asarray(d) == k
+            if mask is not None:
+                sel &= mask
+            if sel.any():
+                changed[sel] = self._move_subset(sel, k)
+
+        return changed
+
+    def possible_moves(self, out=None):
+        """Returns an (n, 4) boolean array, True where the board can be
+        moved in the direction of the matching index of DIRS.
+
+        The array is written to out when it is given"""
+        return legal_moves(self.exponents, out)
+
+    def check_game_over(self, legal=None):
+        """Returns an (n,) boolean array, True where the game is over.
+
+        legal can be passed in if possible_moves was already computed"""
+        if legal is None:
+            legal = self.possible_moves()
+        return (self.n_empty_tiles() == 0) & ~legal.any(axis=1)
+
+    def add_random_tile(self, mask=None):
+        """Adds a tile to a random empty spot of each board, with the
+        same distribution as Board.add_random_tile.
+
+        Boards that are full, or False in the (n,) boolean mask, are
+        left alone."""
+        flat = self.exponents.reshape(len(self), N_CELLS)
+        empty = flat == 0
+        n_empty = empty.sum(axis=1)
+        sel = n_empty > 0
+        if mask is not None:
+            sel &= mask
+        idx = np.flatnonzero(sel)
+        if len(idx) == 0:
+            return
+
+        values = np.where(self.rng.random(len(idx)) < self.prob_2, 1, 2)
+        # pick the k-th empty cell with k uniform over the empty cells
+        k = (self.rng.random(len(idx)) * n_empty[idx]).astype(np.int64)
+        cells = np.argmax(np.cumsum(empty[idx], axis=1) > k[:, None], axis=1)
+        flat[idx, cells] = values
+
+    def turn(self, d, mask=None):
+        """Moves the boards and adds a tile to the boards that changed
+
+        Returns : ndarray (n,) bool, True where the board changed"""
+        changed = self.move(d, mask)
+        self.add_random_tile(changed)
+        return changed
@@ -0,0 +1,267 @@
+"""Benchmarks of the board operations and the players
+
+Times each Board operation over a fixed set of positions made from a
+seed, and the players' next_move on a few of those positions, then
+writes the results as JSON and compares them against a stored baseline.
+
+Usage:
+    python -m py2048.bench --output results.json
+    python -m py2048.bench --baseline benchmarks/baseline.json --threshold 0.25
+    python -m py2048.bench --quick --output benchmarks/baseline.json
+
+The command exits with status 1 when a benchmark is slower than the
+baseline by more than the threshold.
+"""
+
+import argparse
+import json
+import platform
+import sys
+import time
+
+import numpy as np
+
+from py2048.board import Board, DIRS
+from py2048.batch import BoardBatch
+from py2048.env import VecEnv
+from py2048 import bitboard, tables
+from py2048.evaluation import Evaluator
+from py2048.players import ExpectimaxPlayer, MCPlayer
+
+DEFAULT_SEED = 2048
+DEFAULT_THRESHOLD = 0.25
+
+
+def make_positions(n, seed=DEFAULT_SEED):
+    """Plays n seeded random games for a random number of turns and
+    returns their grids, in the Board layout, and scores"""
+    rng = np.random.default_rng(seed)
+    batch = BoardBatch(n, seed=rng)
+    turns = rng.integers(0, 200, size=n)
+    for t in range(turns.max()):
+        legal = batch.possible_moves()
+        keys = np.where(legal, rng.random(legal.shape), -1)
+        batch.turn(np.argmax(keys, axis=1), (turns > t) & legal.any(axis=1))
+    return batch.grids, batch.score
+
+
+def time_op(op, min_time=0.2, repeat=3):
+    """Best time per call of op over repeat runs of at least min_time
+    seconds each"""
+    best = None
+    for r in range(repeat):
+        calls = 0
+        start = time.perf_counter()
+        while True:
+            op()
+            calls += 1
+            elapsed = time.perf_counter() - start
+            if elapsed >= min_time:
+                break
+        per_call = elapsed / calls
+        best = per_call if best is None else min(best, per_call)
+    return best
+
+
+def board_benchmarks(grids, scores, min_time):
+    """Times the Board operations, each call covering every position.
+
+    Returns : dict of name to seconds per position"""
+    boards = [Board.from_grid(grid, score) for grid, score in zip(grids, scores)]
+
+    def over_boards(method, *args):
+        def op():
+            for b in boards:
+                getattr(b, method)(*args)
+        return op
+
+    def uncached(method):
+        # legality is kept per grid, so forget it to time the work itself
+        def op():
+            for b in boards:
+                b._legal_key = None
+                getattr(b, method)()
+        return op
+
+    def moves(d):
+        def op():
+            for b in boards:
+                b.undo(b.make_move(d))
+        return op
+
+    def random_tiles():
+        for b in boards:
+            if b.n_empty_tiles():
+                b.undo(b.add_random_tile())
+
+    ev = Evaluator(np.array([-0.1, 40, -1, 1]), np.array([1, 0.5, 1, 1]))
+    exponents = [tables.cell_exponents(b.grid) for b in boards]
+    packed = [bitboard.to_bitboard(grid) for grid in grids]
+
+    ops = {"board.legal_moves": uncached("legal_moves"),
+           "board.possible_moves": uncached("possible_moves"),
+           "board.check_game_over": uncached("check_game_over"),
+           "board.n_empty_tiles": over_boards("n_empty_tiles"),
+           "board.add_random_tile": random_tiles,
+           "board.n_merges_available": over_boards("n_merges_available"),
+           "board.smoothness": over_boards("smoothness"),
+           "board.n_out_of_order": over_boards("n_out_of_order"),
+           "evaluator.evaluate": lambda: [ev.evaluate(e, 0) for e in exponents],
+           "bitboard.move": lambda: [bitboard.move(p, d) for p in packed
+                                     for d in DIRS]}
+    for d in DIRS:
+        ops["board.make_move." + d] = moves(d)
+
+    results = {}
+    for name, op in ops.items():
+        per_call = time_op(op, min_time)
+        n = len(boards) * (len(DIRS) if name == "bitboard.move" else 1)
+        results[name] = per_call / n
+    return results
+
+
+def batch_benchmarks(grids, min_time):
+    """Times BoardBatch over all the positions at once.
+
+    Returns : dict of name to seconds per board"""
+    batch = BoardBatch.from_grids(np.repeat(grids, 100, axis=0))
+    exponents = batch.exponents.copy()
+
+    def move():
+        batch.exponents[...] = exponents
+        batch.move(np.arange(len(batch)) % len(DIRS))
+
+    env = VecEnv(len(batch), seed=0)
+    actions = np.arange(len(env)) % len(DIRS)
+
+    return {"batch.move": time_op(move, min_time) / len(batch),
+            "batch.possible_moves":
+                time_op(batch.possible_moves, min_time) / len(batch),
+            "env.step": time_op(lambda: env.step(actions), min_time) / len(env)}
+
+
+def player_benchmarks(grids, scores, quick):
+    """Times next_move of the players on a few positions.
+
+    Returns : dict of name to dict of seconds per move and nodes or
+    playouts per second"""
+    picks = [k for k, grid in enumerate(grids) if np.sum(grid == 1) >= 2]
+    picks = picks[:2 if quick else 5]
+    depth = 1 if quick else 2
+    trials = 20 if quick else 100
+    players = {"expectimax.depth%d" % depth: ExpectimaxPlayer(depth),
+               "expectimax.depth%d.tt" % depth:
+                   ExpectimaxPlayer(depth, tt_size=100000),
+               "mc.serial": MCPlayer(10, trials),
+               "mc.vectorized": MCPlayer(10, trials, vectorized=True, seed=0)}
+
+    results = {}
+    for name, p in players.items():
+        elapsed = 0.0
+        work = 0
+        for k in picks:
+            p.b = Board.from_grid(grids[k], scores[k])
+            start = time.perf_counter()
+            p.next_move()
+            elapsed += time.perf_counter() - start
+            if isinstance(p, ExpectimaxPlayer):
+                work += p.nodes_searched
+            else:
+                work += p.trials * len(p.b.possible_moves())
+        unit = ("nodes_per_second" if isinstance(p, ExpectimaxPlayer)
+                else "playouts_per_second")
+        results[name] = {"seconds_per_move": elapsed / len(picks),
+                         unit: work / elapsed}
+    return results
+
+
+def run(n_positions=200, seed=DEFAULT_SEED, quick=False):
+    """Runs every benchmark and returns the results as a dict"""
+    min_time = 0.05 if quick else 0.2
+    grids, scores = make_positions(n_positions, seed)
+    timings = {}
+    for name, per_op in board_benchmarks(grids, scores, min_time).items():
+        timings[name] = {"seconds_per_op": per_op}
+    for name, per_op in batch_benchmarks(grids, min_time).items():
+        timings[name] = {"seconds_per_op": per_op,
+                         "ops_per_second": 1 / per_op}
+    timings.update(player_benchmarks(grids, scores, quick))
+
+    return {"meta": {"python": platform.python_version(),
+                     "numpy": np.__version__,
+                     "machine": platform.machine(),
+                     "n_positions": n_positions,
+                     "seed": seed,
+                     "quick": quick},
+            "results": timings}
+
+
+def time_of(entry):
+    """The time per operation of a result entry, lower is better"""
+    if "seconds_per_op" in entry:
+        return entry["seconds_per_op"]
+    return entry["seconds_per_move"]
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """Compares results against baseline, both as returned by run.
+
+    Returns : list of (name, baseline time, time, ratio) for the
+    benchmarks more than threshold slower than the baseline.  Those
+    missing from the baseline are skipped, see missing_baselines."""
+    regressions = []
+    for name, entry in sorted(results["results"].items()):
+        if name not in baseline["results"]:
+            continue
+        old = time_of(baseline["results"][name])
+        new = time_of(entry)
+        ratio = new / old
+        if ratio > 1 + threshold:
+            regressions.append((name, old, new, ratio))
+    return regressions
+
+
+def missing_baselines(results, baseline):
+    """Names of the benchmarks in results that compare can't check
+    because baseline has no entry for them"""
+    return sorted(name for name in results["results"]
+                  if name not in baseline["results"])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="JSON results to compare against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed slowdown as a fraction, default %(default)s")
+    parser.add_argument("--positions", type=int, default=200,
+                        help="number of positions, default %(default)s")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--quick", action="store_true",
+                        help="shorter timings and smaller player searches")
+    args = parser.parse_args(argv)
+
+    results = run(args.positions, args.seed, args.quick)
+    for name, entry in sorted(results["results"].items()):
+        print("%-32s %12.3g s" % (name, time_of(entry)))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        for name in missing_baselines(results, baseline):
+            print("NO BASELINE %s" % name)
+        regressions = compare(results, baseline, args.threshold)
+        for name, old, new, ratio in regressions:
+            print("REGRESSION %s: %.3g s -> %.3g s (%.2fx)" %
+                  (name, old, new, ratio))
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,280 @@
+"""A bitboard backend for the default 4x4 game of 2048
+
+The whole board is packed into a single 64-bit integer.  Each cell is
+a 4-bit nibble holding the log2 exponent of the tile, with 0 meaning an
+empty cell.  Cell (i, j) lives in nibble 4*i + j, so row i is the 16-bit
+value (board >> 16*i) & 0xFFFF with column j in nibble j of the row.
+
+Moves are done one row at a time through the lookup tables in
+py2048.tables, which hold the result of sliding every possible 16-bit
+row.  Up and down moves transpose the board, do a left or right move on
+the rows and transpose back.
+
+Because of the 4-bit cells the largest tile is 2**15 = 32768.  Two
+32768 tiles do not merge.
+"""
+
+import numpy as np
+
+from py2048.tables import row_tables
+from py2048.board import GRID_SIZE, PROB_2, DIRS
+
+ROW_MASK = 0xFFFF
+CELL_MASK = 0xF
+N_CELLS = GRID_SIZE[0] * GRID_SIZE[1]
+
+
+def to_bitboard(grid):
+    """Packs a grid in the Board layout (1s for blank spaces) into an int"""
+    exponents = np.log2(np.asarray(grid, dtype=float)).astype(int)
+    board = 0
+    for k, e in enumerate(exponents.ravel()):
+        board |= int(e) << (4 * k)
+    return board
+
+
+def to_grid(board):
+    """Unpacks a bitboard into a grid in the Board layout"""
+    exponents = np.array([(board >> (4 * k)) & CELL_MASK
+                          for k in range(N_CELLS)])
+    grid = np.where(exponents == 0, 1, 2.0 ** exponents)
+    return grid.reshape(GRID_SIZE)
+
+
+def transpose(board):
+    """Swaps the rows and columns of the board"""
+    a1 = board & 0xF0F00F0FF0F00F0F
+    a2 = board & 0x0000F0F00000F0F0
+    a3 = board & 0x0F0F00000F0F0000
+    a = a1 | (a2 << 12) | (a3 >> 12)
+    b1 = a & 0xFF00FF0000FF00FF
+    b2 = a & 0x00FF00FF00000000
+    b3 = a & 0x00000000FF00FF00
+    return b1 | (b2 >> 24) | (b3 << 24)
+
+
+def mirror(board):
+    """Reverses the order of the columns"""
+    return (((board & 0x000F000F000F000F) << 12) |
+            ((board & 0x00F000F000F000F0) << 4) |
+            ((board >> 4) & 0x00F000F000F000F0) |
+            ((board >> 12) & 0x000F000F000F000F))
+
+
+def flip(board):
+    """Reverses the order of the rows"""
+    return (((board & 0xFFFF) << 48) |
+            ((board & 0xFFFF0000) << 16) |
+            ((board >> 16) & 0xFFFF0000) |
+            ((board >> 48) & 0xFFFF))
+
+
+# directions after mirror, flip and transpose
+MIRROR_DIRS = {"left": "right", "right": "left", "up": "up", "down": "down"}
+FLIP_DIRS = {"left": "left", "right": "right", "up": "down", "down": "up"}
+TRANSPOSE_DIRS = {"left": "up", "right": "down", "up": "left", "down": "right"}
+# the 8 symmetries of the board are numbered by which of mirror (1),
+# flip (2) and transpose (4) they apply, in that order
+N_SYMMETRIES = 8
+
+
+def symmetry(board, s):
+    """Applies symmetry number s to the board"""
+    if s & 1:
+        board = mirror(board)
+    if s & 2:
+        board = flip(board)
+    if s & 4:
+        board = transpose(board)
+    return board
+
+
+def symmetry_move(d, s):
+    """The direction d becomes on a board after symmetry s"""
+    if s & 1:
+        d = MIRROR_DIRS[d]
+    if s & 2:
+        d = FLIP_DIRS[d]
+    if s & 4:
+        d = TRANSPOSE_DIRS[d]
+    return d
+
+
+def inverse_symmetry_move(d, s):
+    """The direction that becomes d after symmetry s"""
+    if s & 4:
+        d = TRANSPOSE_DIRS[d]
+    if s & 2:
+        d = FLIP_DIRS[d]
+    if s & 1:
+        d = MIRROR_DIRS[d]
+    return d
+
+
+def canonical(board):
+    """The smallest of the 8 symmetric boards, and the number of the
+    symmetry that gives it"""
+    return min((symmetry(board, s), s) for s in range(N_SYMMETRIES))
+
+
+def _move_rows(board, table, score_table):
+    new_board = 0
+    score = 0
+    for i in range(GRID_SIZE[0]):
+        row = (board >> (16 * i)) & ROW_MASK
+        new_board |= table[row] << (16 * i)
+        score += score_table[row]
+    return new_board, score
+
+
+def move(board, d):
+    """Moves the tiles of the board in the direction d
+
+    Parameters
+    ----------
+    board : int
+        The bitboard to move
+    d : str
+        The direction to move the tiles on the grid
+        should be in ["left", "right", "up", "down"]
+
+    Returns : (int, int) the new board and the score gained by the move
+    """
+    t = row_tables()
+
+    if d == "left":
+        return _move_rows(board, t.left_list, t.score_list)
+    elif d == "right":
+        return _move_rows(board, t.right_list, t.score_list)
+    elif d == "up":
+        new_board, score = _move_rows(transpose(board), t.left_list,
+                                      t.score_list)
+        return transpose(new_board), score
+    elif d == "down":
+        new_board, score = _move_rows(transpose(board), t.right_list,
+                                      t.score_list)
+        return transpose(new_board), score
+
+
+def possible_moves(board):
+    """Returns a list of the directions that change the board"""
+    return [d for d in DIRS if move(board, d)[0] != board]
+
+
+def n_empty(board):
+    """Counts the number of empty cells on the board"""
+    # fold each nibble onto its lowest bit, then count the nibbles with
+    # no bits set
+    board |= (board >> 2) & 0x3333333333333333
+    board |= board >> 1
+    board = ~board & 0x1111111111111111
+    return bin(board).count("1")
+
+
+def empty_cells(board):
+    """Returns the nibble indices of the empty cells"""
+    return [k for k in range(N_CELLS) if (board >> (4 * k)) & CELL_MASK == 0]
+
+
+def add_random_tile(board, prob_2=PROB_2, rng=np.random):
+    """Adds a 2 or a 4 to a random empty cell of the board
+
+    Uses the same distribution as Board.add_random_tile.  rng can be
+    the np.random module or an np.random.Generator.
+
+    Returns : int the new board
+    """
+    exponent = 1 if rng.random() < prob_2 else 2
+    cells = empty_cells(board)
+    k = cells[int(rng.random() * len(cells))]
+    return board | (exponent << (4 * k))
+
+
+def check_game_over(board):
+    return n_empty(board) == 0 and possible_moves(board) == []
+
+
+def max_tile(board):
+    """Returns the value of the largest tile on the board"""
+    return 2 ** max((board >> (4 * k)) & CELL_MASK for k in range(N_CELLS))
+
+
+class BitBoard:
+    """A 4x4 board of the game 2048 stored as a 64-bit integer
+
+    Has the same interface as Board for playing a game, but does not
+    compute the heuristics.  Use to_board to get a Board for those.
+
+    Parameters
+    ----------
+    prob_2 : numeric in [0,1]
+        The probability of generating a 2 when a random tile is added
+
+    Attributes
+    ----------
+    board : int
+        the packed state of the game
+    prob_2 : numeric in [0,1]
+        Initialized probability of generating a 2
+    game_over : bool
+        Represents whether the game is over
+    score : int
+        Current score of the game
+    """
+    def __init__(self, prob_2=PROB_2):
+        self.board = 0
+        self.prob_2 = prob_2
+        self.game_over = False
+        self.score = 0
+
+        self.add_random_tile()
+        self.add_random_tile()
+
+    @classmethod
+    def from_board(cls, b):
+        """Creates a BitBoard with the same state as the Board b"""
+        bb = cls.__new__(cls)
+        bb.board = to_bitboard(b.grid)
+        bb.prob_2 = b.prob_2
+        bb.game_over = b.game_over
+        bb.score = b.score
+        return bb
+
+    def to_board(self):
+        """Returns a Board with the same state as this BitBoard"""
+        from py2048.board import Board
+
+        return Board.from_grid(to_grid(self.board), self.score, self.prob_2)
+
+    @property
+    def grid(self):
+        return to_grid(self.board)
+
+    def move(self, d, check_only=False):
+        new_board, score = move(self.board, d)
+        if check_only:
+            return new_board != self.board
+        self.board = new_board
+        self.score += score
+
+    def n_empty_tiles(self):
+        return n_empty(self.board)
+
+    def empty_tiles(self):
+        return [divmod(k, GRID_SIZE[1]) for k in empty_cells(self.board)]
+
+    def add_random_tile(self):
+        self.board = add_random_tile(self.board, self.prob_2)
+
+    def possible_moves(self):
+        return possible_moves(self.board)
+
+    def check_game_over(self):
+        return check_game_over(self.board)
+
+    def turn(self, d):
+        """Makes the move d, adds a random tile and checks if the game is
+        over, like Board.turn"""
+        self.move(d)
+        self.add_random_tile()
+        self.game_over = self.check_game_over()
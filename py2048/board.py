@@ -3,10 +3,21 @@
 import numpy as np
 import copy
 
+from py2048 import heuristics, tables
+from py2048.expgrid import ExpGrid
+
 GRID_SIZE = (4,4)
 PROB_2 = 0.9
 DIRS = ["left", "right", "up", "down"]
 
+# kinds of undo records
+UNDO_SAVE = 0
+UNDO_TILE = 1
+# number of saved grids the undo stack starts with
+UNDO_STACK_SIZE = 32
+# number of uniform random numbers drawn at a time for add_random_tile
+RANDOM_BUFFER_SIZE = 256
+
 def pos(i, j, flip=False):
     """Accessory function to access by column and row instead of row and column"""
     if flip:
@@ -27,6 +38,10 @@ class Board:
         Dimensions of the grid for this board
     prob_2 : numeric in [0,1]
         The probability of generating a 2 when a random tile is added
+    seed : int or None
+        Seed of the random tiles.  None draws a seed from np.random when
+        the board first needs one, so np.random.seed still fixes the
+        game and boards that never add a tile leave np.random alone.
 
     Attributes
     ----------
@@ -35,28 +50,77 @@ class Board:
     prob_2 : numeric in [0,2]
         Initialized probability of generating a 2
     game_over : bool
-        Represents whether the game is over
+        Represents whether the game is over, read from legal_moves
     score : int
         Current score of the game
+    seed : int
+        Seed of rng
+    rng : np.random.Generator
+        Random numbers of add_random_tile, made on first use.  Two
+        boards with the same seed given the same moves add the same
+        tiles.
+
+    Searches change the board in place and take changes back with undo.
+    make_move, place_tile, add_random_tile and save return an undo
+    record, a short tuple.  Moves and saves copy the grid into a stack
+    of grids allocated ahead of time, so undoing a move is a copy back
+    and no new arrays are made per move.  Records have to be undone in
+    the reverse order they were made, and undoing a move or a save also
+    undoes every change made after it.
     """
-    def __init__(self, grid_size=GRID_SIZE, prob_2=PROB_2):
+    def __init__(self, grid_size=GRID_SIZE, prob_2=PROB_2, seed=None):
         """Initialize board by creating an array of shape grid_size.
 
         grid_size is assumed to be the same in both dimensions"""
-        self.grid = np.ones(grid_size)
-        self.prob_2 = prob_2
-        self.game_over = False
-        self.score = 0
+        self._setup(np.ones(grid_size), prob_2, seed)
 
         self.add_random_tile()
         self.add_random_tile()
 
+    @classmethod
+    def from_grid(cls, grid, score=0, prob_2=PROB_2, seed=None):
+        """Creates a board with a copy of grid and the score given,
+        without adding any tiles.  grid is in the Board layout or an
+        ExpGrid."""
+        if isinstance(grid, ExpGrid):
+            grid = grid.to_grid()
+        b = cls.__new__(cls)
+        b._setup(np.array(grid, dtype=float), prob_2, seed)
+        b.score = score
+        return b
+
+    def _setup(self, grid, prob_2, seed):
+        self.grid = grid
+        self.prob_2 = prob_2
+        self._seed = seed
+        self._rng = None
+        self._draws = []
+        self._n_drawn = 0
+        self.score = 0
+        self._legal_key = None
+        self._legal = None
+        self._undo_grids = np.empty((UNDO_STACK_SIZE,) + grid.shape)
+        self._undo_top = 0
+
+    @property
+    def seed(self):
+        if self._seed is None:
+            self._seed = int(np.random.randint(2**31))
+        return self._seed
+
+    @property
+    def rng(self):
+        if self._rng is None:
+            self._rng = np.random.default_rng(self.seed)
+        return self._rng
+
     def move(self, d, check_only=False):
         """Moves the tiles in the direction specified, or checks if a
         move could be made in that direction.
 
         Does not check the legitimacy of move for speed purposes.
-        Increments the score when two tiles are merged.
+        Increments the score when two tiles are merged.  4x4 grids are
+        moved with the row transition tables from py2048.tables.
 
         Parameters
         ----------
@@ -67,6 +131,10 @@ class Board:
             Method returns True if a move could be made in the direction d
         """
 
+        exponents = tables.cell_exponents(self.grid)
+        if exponents is not None:
+            return self._table_move(exponents, d, check_only)
+
         if d == "left" :
             start = 0
             stop = self.grid.shape[0]
@@ -123,6 +191,37 @@ class Board:
                         first_empty += inc
                         compressed = False
 
+    def _table_move(self, exponents, d, check_only):
+        """Does the work of move with the row transition tables.
+
+        exponents is the flat list from tables.cell_exponents"""
+        t = tables.row_tables()
+        if d == "left" or d == "right":
+            lines = tables.row_codes(exponents)
+        else:
+            lines = tables.col_codes(exponents)
+        if d == "left" or d == "up":
+            changed = t.changed_left_list
+            moved = t.left_list
+        else:
+            changed = t.changed_right_list
+            moved = t.right_list
+
+        can_move = any([changed[code] for code in lines])
+        if check_only or not can_move:
+            return can_move
+
+        values = [t.values_list[moved[code]] for code in lines]
+        if d == "left" or d == "right":
+            self.grid[...] = values
+        else:
+            self.grid.T[...] = values
+        self.score += sum([t.score_list[code] for code in lines])
+
+    def exp_grid(self):
+        """The grid as an ExpGrid of log2 exponents"""
+        return ExpGrid.from_grid(self.grid)
+
     def n_empty_tiles(self):
         """Calculates the number of empty tiles currently on the board"""
 
@@ -133,51 +232,139 @@ class Board:
 
         return list(zip(*np.where(self.grid == 1)))
 
-    def add_random_tile(self):
+    def _uniform(self):
+        """Next uniform random number of rng, drawn RANDOM_BUFFER_SIZE
+        at a time"""
+        if self._n_drawn == len(self._draws):
+            self._draws = self.rng.random(RANDOM_BUFFER_SIZE).tolist()
+            self._n_drawn = 0
+        u = self._draws[self._n_drawn]
+        self._n_drawn += 1
+        return u
+
+    def add_random_tile(self, rng=None):
         """Adds a tile to a random empty spot on the grid.  The value
-        of the tile is randomly determined."""
-        tile_value = 2 if np.random.random() < self.prob_2 else 4
-
-        empty_tiles = self.empty_tiles()
-        self.grid[empty_tiles[np.random.choice(len(empty_tiles))]] = tile_value
+        of the tile is randomly determined.
+
+        The random numbers come from the board's rng unless another
+        rng, such as np.random, is given.  Searches that play random
+        tiles on the board pass their own so the game's tiles don't
+        depend on the search.
+
+        Returns : tuple, the undo record"""
+        if rng is None:
+            u_value = self._uniform()
+            u_cell = self._uniform()
+        else:
+            u_value, u_cell = rng.random(2).tolist()
+        tile_value = 2 if u_value < self.prob_2 else 4
+
+        empty = np.flatnonzero(self.grid == 1)
+        cell = int(empty[int(u_cell * len(empty))])
+        return self.place_tile(divmod(cell, self.grid.shape[1]), tile_value)
+
+    def save(self):
+        """Pushes a copy of the grid and the score on the undo stack.
+
+        Returns : tuple, the undo record"""
+        top = self._undo_top
+        if (top == len(self._undo_grids) or
+                self._undo_grids.shape[1:] != self.grid.shape):
+            grids = np.empty((max(2 * top, UNDO_STACK_SIZE),) + self.grid.shape)
+            if self._undo_grids.shape[1:] == self.grid.shape:
+                grids[:top] = self._undo_grids[:top]
+            self._undo_grids = grids
+        np.copyto(self._undo_grids[top], self.grid)
+        self._undo_top = top + 1
+        return (UNDO_SAVE, top, self.score)
+
+    def make_move(self, d):
+        """Moves the tiles in the direction d, like move.
+
+        Returns : tuple, the undo record"""
+        record = self.save()
+        self.move(d)
+        return record
+
+    def place_tile(self, i, value):
+        """Puts a tile of value at the empty position i
+
+        Returns : tuple, the undo record"""
+        self.grid[i] = value
+        return (UNDO_TILE, i)
+
+    def undo(self, record):
+        """Takes back the change that returned record and every change
+        made after it"""
+        if record[0] == UNDO_TILE:
+            self.grid[record[1]] = 1
+        else:
+            np.copyto(self.grid, self._undo_grids[record[1]], casting="unsafe")
+            self._undo_top = record[1]
+            self.score = record[2]
+
+    def legal_moves(self):
+        """Whether a move in each direction of DIRS would change the grid.
+
+        All four directions are checked in one pass, and the result is
+        kept until the grid changes, so possible_moves, check_game_over
+        and game_over on the same grid share the work.  The grid's bytes
+        are the cache key, which catches in place changes as well.
+
+        Returns : tuple of 4 bools"""
+        key = self.grid.tobytes()
+        if key == self._legal_key:
+            return self._legal
+
+        exponents = tables.cell_exponents(self.grid)
+        if exponents is not None:
+            t = tables.row_tables()
+            rows = tables.row_codes(exponents)
+            cols = tables.col_codes(exponents)
+            legal = (any([t.changed_left_list[code] for code in rows]),
+                     any([t.changed_right_list[code] for code in rows]),
+                     any([t.changed_left_list[code] for code in cols]),
+                     any([t.changed_right_list[code] for code in cols]))
+        else:
+            legal = tuple(bool(self.move(d, check_only=True)) for d in DIRS)
+
+        self._legal_key = key
+        self._legal = legal
+        return legal
 
     def possible_moves(self):
         """Returns a list of the possible move directions"""
-        moves = []
-        for d in DIRS:
-            if self.move(d, check_only=True):
-                moves.append(d)
-
-        return moves
+        return [d for d, ok in zip(DIRS, self.legal_moves()) if ok]
 
     def check_game_over(self):
-        return self.n_empty_tiles() == 0 and self.possible_moves() == []
+        return not any(self.legal_moves()) and self.n_empty_tiles() == 0
+
+    @property
+    def game_over(self):
+        return self.check_game_over()
 
     def turn(self, d):
         """Taking a turn in the game consists of making a move followed by
         adding a tile to the board.
 
-        Assumes game is not over to start and
-        checks if the game is over at the end."""
+        Assumes game is not over to start.
+
+        Returns : tuple, the undo record of the added tile"""
         self.move(d)
-        self.add_random_tile()
-        self.game_over = self.check_game_over()
+        return self.add_random_tile()
 
     def n_merges_available(self):
         """Count the number of tiles that can be merged
 
         Returns : int"""
-        saved_grid = self.grid.copy()
-        saved_score = self.score
-        init_empty = self.n_empty_tiles()
-        self.move("left")
-        horizontal_merges = self.n_empty_tiles() - init_empty 
-        self.grid = saved_grid.copy()
-        self.move("up")
-        vertical_merges = self.n_empty_tiles() - init_empty 
-        self.grid = saved_grid.copy()
-
-        return horizontal_merges + vertical_merges
+        exponents = tables.cell_exponents(self.grid)
+        if exponents is not None:
+            merges = tables.row_tables().merges_list
+            return sum([merges[code] for code in
+                        tables.row_codes(exponents) +
+                        tables.col_codes(exponents)])
+
+        return int(heuristics.n_merges_available(self.grid))
 
     def smoothness(self):
         """Smoothness is a measure of how similar adjacent tiles are
@@ -188,28 +375,7 @@ class Board:
 
         Returns : float
         """
-
-        smoothness = 0
-
-        log_grid = np.log(self.grid)
-
-        for i in range(self.grid.shape[0]):
-            previous_tile = 0
-            for j in range(self.grid.shape[1]):
-                if log_grid[i, j] != 0:
-                    if previous_tile != 0:
-                        smoothness += np.abs(previous_tile - log_grid[i, j])
-                    previous_tile = log_grid[i, j]
-
-        for i in range(self.grid.shape[1]):
-            previous_tile = 0
-            for j in range(self.grid.shape[0]):
-                if log_grid[j, i] != 0:
-                    if previous_tile != 0:
-                        smoothness += np.abs(previous_tile - log_grid[j, i])
-                    previous_tile = log_grid[j, i]
-
-        return smoothness
+        return heuristics.smoothness(self.grid)
 
     def n_out_of_order(self):
         """Measure of the monotonicity of the board
@@ -220,31 +386,4 @@ class Board:
 
         Returns : int
         """
-        l_out_of_order = 0
-        r_out_of_order = 0
-        for i in range(self.grid.shape[0]):
-            for j in range(self.grid.shape[1]-1):
-                cur_val = self.grid[i, j]
-                if cur_val != 1:
-                    cur_slice = self.grid[i, (j+1):]
-                    l_out_of_order += np.sum((cur_slice > cur_val) &
-                                             (cur_slice != 1))
-                    r_out_of_order += np.sum((cur_slice < cur_val) &
-                                             (cur_slice != 1))
-
-        h_out_of_order = min(l_out_of_order, r_out_of_order)
-
-        u_out_of_order = 0
-        d_out_of_order = 0
-        for i in range(self.grid.shape[1]):
-            for j in range(self.grid.shape[0]-1):
-                cur_val = self.grid[j, i]
-                if cur_val != 1:
-                    cur_slice = self.grid[(j+1):, i]
-                    u_out_of_order += np.sum((cur_slice > cur_val) &
-                                             (cur_slice != 1))
-                    d_out_of_order += np.sum((cur_slice < cur_val) &
-                                             (cur_slice != 1))
-        v_out_of_order = min(u_out_of_order, d_out_of_order)
-
-        return h_out_of_order + v_out_of_order
+        return int(heuristics.n_out_of_order(self.grid))
@@ -0,0 +1,248 @@
+"""A memory mapped book of precomputed moves for common 4x4 positions
+
+Positions are stored once for all 8 symmetries of the board: the key
+of a position is the smallest bitboard (see py2048.bitboard) of its
+rotations and reflections, and the book holds the best move of that
+canonical board.  A lookup canonicalizes the board, finds the key with
+a binary search and maps the move back through the symmetry.
+
+The file is an 8 byte magic header and the number of entries n as a
+uint64, followed by the n sorted keys as uint64, their values as
+float64 and their moves as one byte each, the index of the move in
+DIRS.  All little-endian.  The reader memory maps the file, so
+processes that open the same book share one copy of it in the page
+cache.
+
+The builder takes the positions from the openings, every board with
+two tiles, and from the positions seen most often in seeded games of
+a player, and searches each one with ExpectimaxPlayer.search_root.
+Books are searched with a score of 0.  With the default h_exp the
+score term is linear, so the current score doesn't change the best
+move.
+
+Usage:
+    python -m py2048.book --output book.bin --games 200 --top 20000 \\
+        --depth 2 --openings
+"""
+
+import argparse
+import itertools
+import json
+import struct
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from py2048 import bitboard, tables
+from py2048.board import Board, DIRS
+from py2048.players import ExpectimaxPlayer
+from py2048.tournament import game_seed, make_player
+
+MAGIC = b"P2048K\x01\x00"
+HEADER = struct.Struct("<8sQ")
+
+
+def board_key(grid):
+    """The bitboard of a grid in the Board layout, or None if it isn't
+    a 4x4 grid with tiles a bitboard can hold"""
+    exponents = tables.cell_exponents(grid)
+    if exponents is None:
+        return None
+    board = 0
+    for k, e in enumerate(exponents):
+        board |= e << (4 * k)
+    return board
+
+
+class Book:
+    """Reads a book file, see the module docstring
+
+    Parameters
+    ----------
+    path : str
+        The book file
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            magic, n = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC:
+            raise Exception("%s is not a book file" % path)
+        self.n = n
+        if n == 0:
+            self.keys = np.zeros(0, dtype="<u8")
+            self.values = np.zeros(0, dtype="<f8")
+            self.moves = np.zeros(0, dtype=np.uint8)
+            return
+        self.keys = np.memmap(path, dtype="<u8", mode="r",
+                              offset=HEADER.size, shape=(n,))
+        self.values = np.memmap(path, dtype="<f8", mode="r",
+                                offset=HEADER.size + 8 * n, shape=(n,))
+        self.moves = np.memmap(path, dtype=np.uint8, mode="r",
+                               offset=HEADER.size + 16 * n, shape=(n,))
+
+    def __len__(self):
+        return self.n
+
+    def find(self, key):
+        """Index of the canonical key in the book, or None"""
+        i = int(np.searchsorted(self.keys, np.uint64(key)))
+        if i < self.n and int(self.keys[i]) == key:
+            return i
+        return None
+
+    def lookup(self, grid):
+        """The book's move and value for a grid in the Board layout, or
+        None when the position isn't in the book"""
+        board = board_key(grid)
+        if board is None:
+            return None
+        key, s = bitboard.canonical(board)
+        i = self.find(key)
+        if i is None:
+            return None
+        d = bitboard.inverse_symmetry_move(DIRS[self.moves[i]], s)
+        return d, float(self.values[i])
+
+
+def write_book(path, entries):
+    """Writes entries, a dict of canonical key to (move index, value)"""
+    keys = np.array(sorted(entries), dtype="<u8")
+    values = np.array([entries[int(k)][1] for k in keys], dtype="<f8")
+    moves = np.array([entries[int(k)][0] for k in keys], dtype=np.uint8)
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(keys)))
+        f.write(keys.tobytes())
+        f.write(values.tobytes())
+        f.write(moves.tobytes())
+
+
+def opening_keys():
+    """Canonical keys of every board with two tiles of 2 or 4"""
+    keys = set()
+    for cells in itertools.combinations(range(bitboard.N_CELLS), 2):
+        for exps in itertools.product([1, 2], repeat=2):
+            board = 0
+            for k, e in zip(cells, exps):
+                board |= e << (4 * k)
+            keys.add(bitboard.canonical(board)[0])
+    return keys
+
+
+def _harvest_game(config, seed, max_moves):
+    """Canonical keys of the positions a move was picked on in one
+    seeded game"""
+    np.random.seed(seed)
+    p = make_player(config)
+    p.reset_board(seed)
+    keys = []
+    try:
+        while not p.b.game_over and (max_moves is None or
+                                     len(keys) < max_moves):
+            board = board_key(p.b.grid)
+            if board is not None:
+                keys.append(bitboard.canonical(board)[0])
+            p.b.turn(p.next_move())
+    finally:
+        p.close()
+    return keys
+
+
+def harvest(config, n_games, seed=0, max_moves=None, workers=None):
+    """Counts the canonical positions of n_games seeded games of the
+    player configuration config (see tournament.make_player)
+
+    Returns : Counter of canonical key to number of times seen"""
+    counts = Counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        seeds = [game_seed(seed, g) for g in range(n_games)]
+        for keys in pool.map(_harvest_game, [config] * n_games, seeds,
+                             [max_moves] * n_games):
+            counts.update(keys)
+    return counts
+
+
+def _solve(keys, depth, player_kwargs):
+    """Searches each canonical key and returns (key, move index, value)
+    for those with a legal move"""
+    p = ExpectimaxPlayer(depth, **player_kwargs)
+    p.evaluator()
+    solved = []
+    for key in keys:
+        p.b = Board.from_grid(bitboard.to_grid(key))
+        moves = p.b.possible_moves()
+        if not moves:
+            continue
+        scores = p.search_root(depth)
+        best = scores.index(max(scores))
+        solved.append((key, DIRS.index(moves[best]), scores[best]))
+    return solved
+
+
+def build_book(path, keys, depth, player_kwargs=None, workers=None,
+               chunk_size=64):
+    """Searches every canonical key to depth and writes the book.
+
+    Parameters
+    ----------
+    path : str
+        The book file to write
+    keys : iterable of int
+        Canonical keys, see bitboard.canonical
+    depth : int
+        Depth of the ExpectimaxPlayer search
+    player_kwargs : dict or None
+        Other ExpectimaxPlayer arguments, h_weights and h_exp for
+        example
+    workers : int or None
+        Number of processes, None for one per CPU
+
+    Returns : the number of entries written
+    """
+    keys = sorted(set(keys))
+    player_kwargs = {} if player_kwargs is None else player_kwargs
+    chunks = [keys[k:k + chunk_size] for k in range(0, len(keys), chunk_size)]
+    entries = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for solved in pool.map(_solve, chunks, [depth] * len(chunks),
+                               [player_kwargs] * len(chunks)):
+            for key, move, value in solved:
+                entries[key] = (move, value)
+    write_book(path, entries)
+    return len(entries)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--output", required=True, help="book file to write")
+    parser.add_argument("--depth", type=int, default=2)
+    parser.add_argument("--openings", action="store_true",
+                        help="add every board with two tiles")
+    parser.add_argument("--games", type=int, default=0,
+                        help="games to harvest positions from")
+    parser.add_argument("--top", type=int, default=10000,
+                        help="most frequent harvested positions kept")
+    parser.add_argument("--player", default="ExpectimaxPlayer",
+                        help="class name from py2048.players for the games")
+    parser.add_argument("--kwargs", default='{"depth": 1}',
+                        help="JSON object of arguments for that player")
+    parser.add_argument("--max-moves", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    keys = set()
+    if args.openings:
+        keys |= opening_keys()
+    if args.games:
+        config = {"player": args.player, "kwargs": json.loads(args.kwargs)}
+        counts = harvest(config, args.games, args.seed, args.max_moves,
+                         args.workers)
+        keys |= set(key for key, n in counts.most_common(args.top))
+    n = build_book(args.output, keys, args.depth, workers=args.workers)
+    print("%d positions written to %s" % (n, args.output))
+
+
+if __name__ == "__main__":
+    main()
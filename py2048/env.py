@@ -0,0 +1,123 @@
+"""A vectorized environment of many 4x4 games for training policies
+
+VecEnv steps N games at once on a BoardBatch.  An action is the index
+in DIRS of the move for each game, the reward is the score the move
+made, and a game that is over after a step is started again right away
+with the next step's observation being its new board.
+
+The arrays returned by reset and step are allocated once and written
+in place on every step, so the observations are the batch's own (N, 4,
+4) uint8 exponent array (0 for an empty space) and no copies are made.
+Copy them before the next step if they have to be kept.
+
+Example Usage:
+>>> env = VecEnv(1024, seed=0)
+>>> obs, legal = env.reset()
+>>> obs, rewards, done, legal = env.step(policy(obs, legal))
+"""
+
+import numpy as np
+
+from py2048.batch import BoardBatch, legal_moves
+from py2048.board import GRID_SIZE, PROB_2, DIRS
+
+
+class VecEnv:
+    """N games of 2048 stepped together
+
+    Parameters
+    ----------
+    n : int
+        Number of games
+    prob_2 : numeric in [0,1]
+        The probability of generating a 2 when a random tile is added
+    seed : int or None
+        Seed of the tiles, see reset
+
+    Attributes
+    ----------
+    batch : BoardBatch
+        The games
+    final_observations : ndarray
+        (n, 4, 4) uint8, the last board of each game that ended on the
+        last step, before it was started again
+    final_scores : ndarray
+        (n,) int64, the score of each game that ended on the last step
+    episode_lengths : ndarray
+        (n,) int64, steps since each game started
+    """
+    def __init__(self, n, prob_2=PROB_2, seed=None):
+        self.batch = BoardBatch(0, prob_2, seed)
+        self.batch.exponents = np.zeros((n,) + GRID_SIZE, dtype=np.uint8)
+        self.batch.score = np.zeros(n, dtype=np.int64)
+        self.rewards = np.zeros(n, dtype=np.int64)
+        self.done = np.zeros(n, dtype=bool)
+        self.legal = np.zeros((n, len(DIRS)), dtype=bool)
+        self.final_observations = np.zeros((n,) + GRID_SIZE, dtype=np.uint8)
+        self.final_scores = np.zeros(n, dtype=np.int64)
+        self.episode_lengths = np.zeros(n, dtype=np.int64)
+        self._last_score = np.zeros(n, dtype=np.int64)
+        self.reset()
+
+    def __len__(self):
+        return len(self.batch)
+
+    @property
+    def observations(self):
+        return self.batch.exponents
+
+    def reset(self, seed=None):
+        """Starts every game again, reseeding the tiles when seed is
+        not None
+
+        Returns : (observations, legal_mask)"""
+        if seed is not None:
+            self.batch.rng = np.random.default_rng(seed)
+        self._restart(None)
+        self.batch.possible_moves(out=self.legal)
+        return self.observations, self.legal
+
+    def _restart(self, mask):
+        """Empties the boards picked by mask, or all of them when it is
+        None, and adds the two starting tiles"""
+        b = self.batch
+        if mask is None:
+            b.exponents[...] = 0
+            b.score[...] = 0
+            self.episode_lengths[...] = 0
+        else:
+            b.exponents[mask] = 0
+            b.score[mask] = 0
+            self.episode_lengths[mask] = 0
+        b.add_random_tile(mask)
+        b.add_random_tile(mask)
+        np.copyto(self._last_score, b.score)
+
+    def step(self, actions):
+        """Moves every game by its action and adds a tile where the
+        board changed.  Illegal actions leave the board as it was.
+        Games that are over afterwards are started again.
+
+        Parameters
+        ----------
+        actions : ndarray
+            (n,) ints, the index in DIRS of the move of each game
+
+        Returns : (observations, rewards, done, legal_mask), where done
+        is True for the games that ended on this step, and observations
+        and legal_mask already show their new boards
+        """
+        b = self.batch
+        b.turn(np.asarray(actions))
+        np.subtract(b.score, self._last_score, out=self.rewards)
+        np.copyto(self._last_score, b.score)
+        self.episode_lengths += 1
+
+        b.possible_moves(out=self.legal)
+        np.logical_not(self.legal.any(axis=1), out=self.done)
+        if self.done.any():
+            self.final_observations[self.done] = b.exponents[self.done]
+            self.final_scores[self.done] = b.score[self.done]
+            self._restart(self.done)
+            self.legal[self.done] = legal_moves(b.exponents[self.done])
+        return self.observations, self.rewards, self.done, self.legal
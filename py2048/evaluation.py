@@ -0,0 +1,133 @@
+"""Table driven evaluation of the ExpectimaxPlayer heuristic for 4x4 boards
+
+The heuristics of ExpectimaxPlayer.board_options are sums over the rows
+and the columns of the board:
+
+* smoothness adds up the log differences of neighbouring tiles in each
+  row and each column
+* the number of empty tiles is the sum of the empty tiles of the rows
+* n_out_of_order takes the smaller of the increasing and decreasing pair
+  counts summed over the rows, and the same for the columns
+
+so each of them can be stored per row code (see py2048.tables) once and
+a board is evaluated with four row and four column lookups.  The
+weighting of the heuristics is kept out of the line tables, and the
+weighted terms that only take a few integer values are tabulated per
+set of weights by Evaluator.
+"""
+
+import numpy as np
+
+from py2048 import tables
+
+_LINE_TABLES = None
+
+
+class LineHeuristics:
+    """Heuristic contributions of every row code
+
+    Attributes
+    ----------
+    smoothness : ndarray
+        log differences of neighbouring tiles in the line
+    empty : ndarray
+        number of empty tiles in the line
+    increasing, decreasing : ndarray
+        number of pairs of tiles where the later tile is larger, or
+        smaller, than the earlier one
+    *_list : list
+        python list copies of the tables above
+    """
+    def __init__(self):
+        lines = tables.unpack_rows(np.arange(tables.N_ROWS))
+        filled = lines != 0
+
+        # log of the tiles, computed like Board.smoothness does
+        logs = np.log(np.where(filled, 2.0 ** lines, 1))
+        compact = tables._compact(np.where(filled, logs, 0))
+        n_tiles = filled.sum(axis=1)
+        diffs = np.abs(compact[:, :-1] - compact[:, 1:])
+        neighbours = np.arange(tables.ROW_LEN - 1) < (n_tiles - 1)[:, None]
+        self.smoothness = np.sum(np.where(neighbours, diffs, 0), axis=1)
+
+        self.empty = tables.ROW_LEN - n_tiles
+
+        self.increasing = np.zeros(tables.N_ROWS, dtype=np.int64)
+        self.decreasing = np.zeros(tables.N_ROWS, dtype=np.int64)
+        for i in range(tables.ROW_LEN):
+            for j in range(i + 1, tables.ROW_LEN):
+                both = filled[:, i] & filled[:, j]
+                self.increasing += both & (lines[:, j] > lines[:, i])
+                self.decreasing += both & (lines[:, j] < lines[:, i])
+
+        self.smoothness_list = self.smoothness.tolist()
+        self.empty_list = self.empty.tolist()
+        self.increasing_list = self.increasing.tolist()
+        self.decreasing_list = self.decreasing.tolist()
+
+
+def line_heuristics():
+    """Returns the LineHeuristics, building them on the first call"""
+    global _LINE_TABLES
+    if _LINE_TABLES is None:
+        _LINE_TABLES = LineHeuristics()
+    return _LINE_TABLES
+
+
+class Evaluator:
+    """Evaluates h_weights.dot(h**h_exp) for the heuristics h of
+    ExpectimaxPlayer.board_options from the line tables.
+
+    The weighted empty tile and out of order terms only take a few
+    integer arguments, so they are tabulated here for the weights given.
+    A new Evaluator has to be made when the weights change.
+
+    Parameters
+    ----------
+    h_weights : numpy.array
+        Weights of smoothness, empty tiles, out of order tiles and score
+    h_exp : numpy.array
+        Exponents of the same four heuristics
+    """
+    def __init__(self, h_weights, h_exp):
+        self.h_weights = np.array(h_weights, dtype=float)
+        self.h_exp = np.array(h_exp, dtype=float)
+        self.lines = line_heuristics()
+
+        w = self.h_weights.tolist()
+        e = self.h_exp.tolist()
+        self.smoothness_weight, self.smoothness_exp = w[0], e[0]
+        self.score_weight, self.score_exp = w[3], e[3]
+
+        n_cells = tables.ROW_LEN * tables.ROW_LEN
+        self.empty_term = [w[1] * float(k) ** e[1] for k in range(n_cells + 1)]
+        # at most 6 pairs per line, 4 lines per direction, 2 directions
+        max_pairs = 2 * tables.ROW_LEN * 6
+        self.out_of_order_term = [w[2] * float(k) ** e[2]
+                                  for k in range(max_pairs + 1)]
+
+    def matches(self, h_weights, h_exp):
+        """Whether this Evaluator was built for these weights"""
+        return (np.array_equal(self.h_weights, h_weights) and
+                np.array_equal(self.h_exp, h_exp))
+
+    def evaluate(self, exponents, score):
+        """Evaluates a board from the flat list of its exponents, as
+        returned by tables.cell_exponents, and its score"""
+        rows = tables.row_codes(exponents)
+        cols = tables.col_codes(exponents)
+        t = self.lines
+
+        smoothness = (sum([t.smoothness_list[code] for code in rows]) +
+                      sum([t.smoothness_list[code] for code in cols]))
+        empty = sum([t.empty_list[code] for code in rows])
+        out_of_order = (
+            min(sum([t.increasing_list[code] for code in rows]),
+                sum([t.decreasing_list[code] for code in rows])) +
+            min(sum([t.increasing_list[code] for code in cols]),
+                sum([t.decreasing_list[code] for code in cols])))
+
+        return (self.smoothness_weight * smoothness ** self.smoothness_exp +
+                self.empty_term[empty] +
+                self.out_of_order_term[out_of_order] +
+                self.score_weight * float(score) ** self.score_exp)
@@ -0,0 +1,88 @@
+"""Compact integer grids of log2 exponents for boards of any size
+
+The Board layout keeps a float64 per cell with 1s for blank spaces.
+An ExpGrid keeps the log2 exponent of each tile as a uint8 instead, 0
+for blank spaces, which is 8 times smaller, hashes as bytes and needs
+no logs for the heuristics that work on log tile values.  Exponents go
+up to 255, so any tile a board of any size can reach fits.
+"""
+
+import struct
+
+import numpy as np
+
+from py2048 import heuristics
+
+
+class ExpGrid:
+    """A grid of log2 exponents, 0 for blank spaces
+
+    Example Usage:
+    >>> e = ExpGrid.from_grid(b.grid)
+    >>> seen = {e.key(): value}
+    >>> b = Board.from_grid(e.to_grid())
+
+    Parameters
+    ----------
+    exponents : array like of ints
+        The exponents, copied into a uint8 array of the same shape
+
+    Attributes
+    ----------
+    exponents : ndarray
+        uint8 array of the exponents
+    """
+    def __init__(self, exponents):
+        self.exponents = np.array(exponents, dtype=np.uint8)
+
+    @classmethod
+    def empty(cls, grid_size):
+        """An ExpGrid of shape grid_size with no tiles"""
+        return cls(np.zeros(grid_size, dtype=np.uint8))
+
+    @classmethod
+    def from_grid(cls, grid):
+        """Converts a grid in the Board layout (1s for blank spaces)"""
+        return cls(np.log2(grid))
+
+    def to_grid(self):
+        """The grid in the Board layout, as float64 with 1s for blank
+        spaces"""
+        return np.ldexp(1.0, self.exponents.astype(np.int64))
+
+    @property
+    def shape(self):
+        return self.exponents.shape
+
+    def copy(self):
+        e = ExpGrid.__new__(ExpGrid)
+        e.exponents = self.exponents.copy()
+        return e
+
+    def key(self):
+        """bytes that identify the grid, its shape included"""
+        shape = self.exponents.shape
+        return (struct.pack("<B%dI" % len(shape), len(shape), *shape) +
+                self.exponents.tobytes())
+
+    def __eq__(self, other):
+        return isinstance(other, ExpGrid) and self.key() == other.key()
+
+    def __hash__(self):
+        return hash(self.key())
+
+    def __repr__(self):
+        return "ExpGrid(%r)" % self.exponents.tolist()
+
+    def n_empty_tiles(self):
+        return int(np.sum(self.exponents == 0))
+
+    def max_tile(self):
+        return 2 ** int(self.exponents.max())
+
+    def smoothness(self):
+        """Same as Board.smoothness, from the exponents instead of logs
+        of the tiles
+
+        Returns : float"""
+        return heuristics.exponent_smoothness(self.exponents)
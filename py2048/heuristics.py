@@ -0,0 +1,99 @@
+"""Vectorized board heuristics for grids of any size
+
+Each function takes one grid in the Board layout (1s for blank spaces)
+or a stack of them with shape (..., rows, columns), and returns the
+same value as the Board method of the same name, one per grid.  The
+work is done with array operations over whole lines, with no Python
+loops over the cells.
+"""
+
+import numpy as np
+
+
+def _compact(lines, filled):
+    """Moves the filled entries of each line to the front, keeping their
+    order"""
+    order = np.argsort(~filled, axis=-1, kind="stable")
+    return np.take_along_axis(lines, order, axis=-1)
+
+
+def _both_orientations(grids):
+    """The rows and the columns of the grids, each as (..., lines, len)"""
+    grids = np.asarray(grids)
+    return grids, np.swapaxes(grids, -1, -2)
+
+
+def _line_smoothness(logs):
+    filled = logs != 0
+    compact = _compact(logs, filled)
+    n_tiles = filled.sum(axis=-1)
+    diffs = np.abs(compact[..., :-1] - compact[..., 1:])
+    neighbours = np.arange(logs.shape[-1] - 1) < (n_tiles - 1)[..., None]
+    return np.sum(np.where(neighbours, diffs, 0), axis=(-2, -1))
+
+
+def smoothness(grids):
+    """Sum of the log differences of neighbouring tiles along the rows
+    and the columns, skipping blank spaces.  See Board.smoothness.
+
+    Returns : float or ndarray
+    """
+    rows, cols = _both_orientations(np.log(np.asarray(grids, dtype=float)))
+    return _line_smoothness(rows) + _line_smoothness(cols)
+
+
+def exponent_smoothness(exponents):
+    """smoothness of grids given as log2 exponents, 0 for blank spaces,
+    like py2048.expgrid.ExpGrid.
+
+    Returns : float or ndarray
+    """
+    rows, cols = _both_orientations(np.asarray(exponents) * np.log(2.0))
+    return _line_smoothness(rows) + _line_smoothness(cols)
+
+
+def _line_out_of_order(lines):
+    filled = lines != 1
+    n = lines.shape[-1]
+    later = np.triu(np.ones((n, n), dtype=bool), 1)
+    # pairs[..., i, j] compares tile j with the earlier tile i
+    pairs = filled[..., :, None] & filled[..., None, :] & later
+    first = lines[..., :, None]
+    second = lines[..., None, :]
+    increasing = np.sum(pairs & (second > first), axis=(-3, -2, -1))
+    decreasing = np.sum(pairs & (second < first), axis=(-3, -2, -1))
+    return np.minimum(increasing, decreasing)
+
+
+def n_out_of_order(grids):
+    """Smaller of the increasing and decreasing pair counts of the rows,
+    plus the same for the columns.  See Board.n_out_of_order.
+
+    Returns : int or ndarray
+    """
+    rows, cols = _both_orientations(grids)
+    return _line_out_of_order(rows) + _line_out_of_order(cols)
+
+
+def _line_merges(lines):
+    filled = lines != 1
+    compact = _compact(lines, filled)
+    # blank spaces are compacted to the end, so a tile equal to the one
+    # before it is a pair of equal neighbouring tiles
+    equal = (compact[..., :-1] == compact[..., 1:]) & (compact[..., 1:] != 1)
+    # in a run of equal tiles the 1st and 2nd merge, the 3rd and 4th, ...
+    # so a merge starts where the run of equal pairs ending there is odd
+    idx = np.arange(lines.shape[-1] - 1)
+    last_unequal = np.maximum.accumulate(np.where(equal, -1, idx), axis=-1)
+    merges = equal & ((idx - last_unequal) % 2 == 1)
+    return np.sum(merges, axis=(-2, -1))
+
+
+def n_merges_available(grids):
+    """Number of merges a left move makes plus the number an up move
+    makes.  See Board.n_merges_available.
+
+    Returns : int or ndarray
+    """
+    rows, cols = _both_orientations(grids)
+    return _line_merges(rows) + _line_merges(cols)
@@ -0,0 +1,288 @@
+"""Per-move stats, latency histograms and profiles of played games
+
+An Instrument is handed to Player.play and collects, for every move,
+how long the player took and the counters of its search_stats (nodes
+searched by ExpectimaxPlayer, random turns played by MCPlayer, ...),
+and for every game a histogram of the move latencies.  Optionally it
+also
+
+* counts the calls of chosen Board and Evaluator methods and the time
+  spent in them, by wrapping the methods for the length of the game
+* runs cProfile around the game and keeps the functions with the most
+  time of their own
+* runs tracemalloc around the game and keeps the peak memory and the
+  lines that allocated the most
+
+Play without an Instrument costs nothing: Player.play only checks for
+one, and Board methods are only wrapped while an Instrument that asked
+for call counts is playing.  Only work in this process is seen, so the
+counters and profiles leave out the worker processes of parallel
+players.
+
+Example Usage:
+>>> inst = Instrument(count_calls=HEURISTIC_METHODS, profile=True)
+>>> ExpectimaxPlayer(2).play(instrument=inst)
+>>> inst.save("stats.json")
+"""
+
+import bisect
+import cProfile
+import functools
+import json
+import pstats
+import time
+import tracemalloc
+
+from py2048.board import Board
+from py2048.evaluation import Evaluator
+
+# classes whose methods count_calls can name, as "Class.method"
+COUNTED_CLASSES = {"Board": Board, "Evaluator": Evaluator}
+# methods that evaluate search leaves: the Evaluator tables on 4x4
+# boards, and the Board heuristics on other sizes
+HEURISTIC_METHODS = ("Evaluator.evaluate", "Board.smoothness",
+                     "Board.n_out_of_order", "Board.n_merges_available",
+                     "Board.n_empty_tiles")
+# upper edges of the latency bins in seconds, doubling from 1 microsecond
+LATENCY_EDGES = [1e-6 * 2 ** k for k in range(28)]
+
+
+class MoveStats:
+    """What happened while picking one move
+
+    Attributes
+    ----------
+    move : int
+        Number of the move in the game, from 0
+    direction : str
+        The move picked
+    seconds : float
+        Time next_move took
+    score, n_empty : int
+        Score and empty tiles of the board the move was picked on
+    search : dict
+        The player's search_stats for the move
+    """
+    def __init__(self, move, direction, seconds, score, n_empty, search):
+        self.move = move
+        self.direction = direction
+        self.seconds = seconds
+        self.score = score
+        self.n_empty = n_empty
+        self.search = search
+
+    def to_dict(self):
+        return {"move": self.move,
+                "direction": self.direction,
+                "seconds": self.seconds,
+                "score": self.score,
+                "n_empty": self.n_empty,
+                "search": self.search}
+
+
+class LatencyHistogram:
+    """Counts of latencies in bins that double in width, see
+    LATENCY_EDGES.  The last bin takes everything longer."""
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_EDGES) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, seconds):
+        self.counts[bisect.bisect_left(LATENCY_EDGES, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if self.min is None or seconds < self.min:
+            self.min = seconds
+        if self.max is None or seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q):
+        """Upper edge of the bin holding the q quantile, capped at the
+        largest latency seen"""
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        seen = 0
+        for k, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank and n:
+                if k == len(LATENCY_EDGES):
+                    return self.max
+                return min(LATENCY_EDGES[k], self.max)
+        return self.max
+
+    def to_dict(self):
+        return {"edges": LATENCY_EDGES,
+                "counts": self.counts,
+                "count": self.count,
+                "total": self.total,
+                "mean": self.total / self.count if self.count else None,
+                "min": self.min,
+                "max": self.max,
+                "p50": self.quantile(0.5),
+                "p90": self.quantile(0.9),
+                "p99": self.quantile(0.99)}
+
+
+class CallCounter:
+    """Wraps methods to count their calls and time them, and puts the
+    original methods back on restore.  names are "Class.method" with a
+    class of COUNTED_CLASSES, or plain Board method names."""
+    def __init__(self, names):
+        self.calls = dict((name, 0) for name in names)
+        self.seconds = dict((name, 0.0) for name in names)
+        self.originals = {}
+        for name in names:
+            cls_name, _, method = name.rpartition(".")
+            if (cls_name or "Board") not in COUNTED_CLASSES:
+                raise Exception("Can't count calls of %s" % name)
+            cls = COUNTED_CLASSES[cls_name or "Board"]
+            self.originals[name] = (cls, method, cls.__dict__[method])
+            setattr(cls, method, self._wrap(name, getattr(cls, method)))
+
+    def _wrap(self, name, method):
+        calls = self.calls
+        seconds = self.seconds
+
+        @functools.wraps(method)
+        def counted(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                seconds[name] += time.perf_counter() - start
+                calls[name] += 1
+        return counted
+
+    def restore(self):
+        for cls, method, original in self.originals.values():
+            setattr(cls, method, original)
+
+    def to_dict(self):
+        return dict((name, {"calls": self.calls[name],
+                            "seconds": self.seconds[name]})
+                    for name in self.calls)
+
+
+class Instrument:
+    """Collects stats of the games played with it, see the module
+    docstring
+
+    Parameters
+    ----------
+    count_calls : sequence of str
+        Methods to count and time, "Evaluator.evaluate" or the name of
+        a Board method for example, see HEURISTIC_METHODS
+    profile : bool
+        Run cProfile around each game
+    trace_memory : bool
+        Run tracemalloc around each game
+    profile_top : int
+        Number of functions and allocating lines kept per game
+
+    Attributes
+    ----------
+    games : list of dict
+        One entry per finished game, see to_dict
+    """
+    def __init__(self, count_calls=(), profile=False, trace_memory=False,
+                 profile_top=30):
+        self.count_calls = tuple(count_calls)
+        self.profile = profile
+        self.trace_memory = trace_memory
+        self.profile_top = profile_top
+        self.games = []
+        self._moves = None
+
+    def begin_game(self, player):
+        self._moves = []
+        self._latency = LatencyHistogram()
+        self._counter = None
+        # the unwrapped method, so record_move's own calls aren't counted
+        self._n_empty_tiles = Board.n_empty_tiles
+        if self.count_calls:
+            self._counter = CallCounter(self.count_calls)
+        self._started_tracing = False
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        self._profiler = None
+        if self.profile:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+
+    def record_move(self, player, d, seconds):
+        b = player.b
+        self._moves.append(MoveStats(len(self._moves), d, seconds,
+                                     int(b.score), int(self._n_empty_tiles(b)),
+                                     player.search_stats()))
+        self._latency.add(seconds)
+
+    def end_game(self, player, result):
+        game = {"result": dict(result),
+                "player": type(player).__name__,
+                "moves": [m.to_dict() for m in self._moves],
+                "latency": self._latency.to_dict()}
+        if self._profiler is not None:
+            self._profiler.disable()
+            game["profile"] = self._profile_summary(self._profiler)
+        if self._counter is not None:
+            self._counter.restore()
+            game["calls"] = self._counter.to_dict()
+        if self.trace_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            stats = tracemalloc.take_snapshot().statistics("lineno")
+            game["memory"] = {
+                "current": current,
+                "peak": peak,
+                "top": [{"where": str(stat.traceback),
+                         "size": stat.size,
+                         "count": stat.count}
+                        for stat in stats[:self.profile_top]]}
+            if self._started_tracing:
+                tracemalloc.stop()
+        self.games.append(game)
+        self._moves = None
+
+    def abort_game(self):
+        """Stops the profiler and tracemalloc and puts the Board methods
+        back after a game that raised, without keeping its stats"""
+        if self._profiler is not None:
+            self._profiler.disable()
+        if self._counter is not None:
+            self._counter.restore()
+        if self._started_tracing:
+            tracemalloc.stop()
+        self._moves = None
+
+    def _profile_summary(self, profiler):
+        """The functions with the most time of their own"""
+        rows = []
+        for (path, line, name), (cc, nc, tt, ct, callers) in \
+                pstats.Stats(profiler).stats.items():
+            rows.append({"function": "%s:%d(%s)" % (path, line, name),
+                         "calls": nc,
+                         "tottime": tt,
+                         "cumtime": ct})
+        rows.sort(key=lambda row: row["tottime"], reverse=True)
+        return rows[:self.profile_top]
+
+    def latency(self):
+        """A LatencyHistogram of the moves of every game"""
+        h = LatencyHistogram()
+        for game in self.games:
+            for move in game["moves"]:
+                h.add(move["seconds"])
+        return h
+
+    def to_dict(self):
+        return {"games": self.games,
+                "latency": self.latency().to_dict()}
+
+    def save(self, path):
+        """Writes to_dict as JSON"""
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
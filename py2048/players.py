@@ -1,9 +1,27 @@
 """ Defines a number of AI players for 2048"""
 
-from py2048.board import Board
-import copy
+from py2048.board import Board, DIRS
+from py2048 import bitboard, tables
+from py2048.evaluation import Evaluator
+from py2048.batch import BoardBatch
+from py2048.ttable import TranspositionTable
+from concurrent.futures import ProcessPoolExecutor
+import time
+import zlib
 import numpy as np
 
+# iterative deepening stops here even if there is time left
+MAX_ITERATIVE_DEPTH = 30
+# initial guess of the ExpectimaxPlayer heuristic, see py2048.tuner
+DEFAULT_H_WEIGHTS = np.array([-0.1, 40, -1, 1])
+DEFAULT_H_EXP = np.array([1, 0.5, 1, 1])
+# MCTSPlayer iterations per move when it has no other budget
+DEFAULT_MCTS_ITERATIONS = 1000
+
+
+class SearchTimeout(Exception):
+    """Raised inside a search when its deadline has passed"""
+
 class Player:
     """ A parent class for the other AI players.
 
@@ -13,26 +31,84 @@ class Player:
     Example Usage:
     >>> p = Player()
     >>> p.play(verbose=True)
+
+    Players that use worker processes keep them in pool until close
+    is called.
     """
 
+    pool = None
+
     def __init__(self):
         self.b = Board()
 
-    def reset_board(self):
-        self.b = Board()
+    def reset_board(self, seed=None):
+        """ Starts a new game on a board with seed """
+        self.b = Board(seed=seed)
 
     def next_move(self):
         return self.b.possible_moves()[0]
 
-    def play(self, verbose = False):
+    def search_stats(self):
+        """ Counters of the work done picking the last move, as a dict
+        of numbers, see py2048.instrument """
+        return {}
+
+    def close(self):
+        """ Shuts down the worker processes, if there are any """
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    def play(self, verbose = False, recorder=None, max_moves=None,
+             instrument=None):
+        """ Plays until the game is over, or until max_moves moves were
+        made when it isn't None.
+
+        recorder, a py2048.records.RecordWriter, records the game when
+        given.  instrument, a py2048.instrument.Instrument, collects
+        per-move stats and profiles when given.
+
+        Returns : dict with the final score, the largest tile, the number
+        of moves made and the seconds the game took"""
+        start = time.perf_counter()
+        if recorder is not None:
+            recorder.begin_game(self.b)
+        if instrument is not None:
+            instrument.begin_game(self)
         i = 0
-        while(not self.b.game_over):
-            move_d = self.next_move()
-            self.b.turn(move_d)
-            i += 1
-            if verbose and i % 3 == 0:
-                print(i)
-                print(np.array(self.b.grid, dtype="int"))
+        try:
+            while(not self.b.game_over and
+                  (max_moves is None or i < max_moves)):
+                if instrument is None:
+                    move_d = self.next_move()
+                else:
+                    move_start = time.perf_counter()
+                    move_d = self.next_move()
+                    instrument.record_move(self, move_d,
+                                           time.perf_counter() - move_start)
+                record = self.b.turn(move_d)
+                if recorder is not None:
+                    recorder.record_turn(move_d, record[1],
+                                         self.b.grid[record[1]])
+                i += 1
+                if verbose and i % 3 == 0:
+                    print(i)
+                    print(np.array(self.b.grid, dtype="int"))
+        except BaseException:
+            # put the Board methods back and stop the profilers
+            if instrument is not None:
+                instrument.abort_game()
+            raise
+
+        if recorder is not None:
+            recorder.end_game()
+        result = {"score": int(self.b.score),
+                  "max_tile": int(self.b.grid.max()),
+                  "moves": i,
+                  "seconds": time.perf_counter() - start}
+        if instrument is not None:
+            instrument.end_game(self, result)
+        return result
 
 class MCPlayer(Player):
     """ A Monte Carlo Player for 2048.
@@ -53,9 +129,34 @@ class MCPlayer(Player):
         Expects either "min" or "sum". Either the minimum score over
         all trials is used or the total score is used. "sum" seems to
         do better.
+
+    workers : int or None
+        Number of processes running the simulations.  When set, the
+        trials of each direction are split into shards of shard_size
+        trials, each with its own random stream from seed, so the
+        results for a seed don't depend on the number of workers.
+        With 1 the shards run in this process.  None simulates with the
+        global np.random state.
+
+    seed : int or None
+        Seed for the simulations when workers is set
+
+    shard_size : int
+        Number of trials simulated by each task when workers is set
+
+    vectorized : bool
+        Simulates the trials of every direction together as one
+        BoardBatch, one turn of every game per step, instead of one
+        game at a time.  Uses seed and ignores workers.
+
+    Attributes
+    ----------
+    rollout_steps : int
+        Number of random turns simulated while picking the last move
     """
 
-    def __init__(self, max_depth, trials, eval_by="sum"):
+    def __init__(self, max_depth, trials, eval_by="sum", workers=None,
+                 seed=None, shard_size=16, vectorized=False):
         self.max_depth = max_depth
         self.trials = trials
         if eval_by == "min":
@@ -64,6 +165,11 @@ class MCPlayer(Player):
             self.use_min = False
         else:
             raise Exception("Incorrect eval_by arg, must be either 'min' or 'sum'")
+        self.workers = workers
+        self.seed_seq = np.random.SeedSequence(seed)
+        self.shard_size = shard_size
+        self.vectorized = vectorized
+        self.rollout_steps = 0
             
         self.b = Board()
 
@@ -74,33 +180,126 @@ class MCPlayer(Player):
         ending earlier if the game is over. Picks the direction
         with the highest score over all trials"""
         
-        saved_board = copy.deepcopy(self.b)
+        self.rollout_steps = 0
+        if self.vectorized:
+            scores = self.batch_scores()
+            return self.b.possible_moves()[scores.index(max(scores))]
+        if self.workers is not None:
+            scores = self.sharded_scores()
+            return self.b.possible_moves()[scores.index(max(scores))]
+
         scores = []
         for d in self.b.possible_moves():
-            self.b.move(d)
+            move_record = self.b.make_move(d)
             total_score = 0
             min_score = np.inf
-            saved_board2 = copy.deepcopy(self.b)
             for i in range(self.trials):
+                # undoing the first move of a trial takes back the rest
+                trial_record = None
                 j = 0
                 while(not self.b.check_game_over() and j < self.max_depth):
                     move_d = np.random.choice(self.b.possible_moves())
-                    self.b.turn(move_d)
+                    record = self.b.make_move(move_d)
+                    if trial_record is None:
+                        trial_record = record
+                    self.b.add_random_tile(np.random)
                     j += 1
+                self.rollout_steps += j
             
                 total_score += self.b.score
                 if self.b.score < min_score:
                     min_score = self.b.score
-                self.b = copy.deepcopy(saved_board2)
+                if trial_record is not None:
+                    self.b.undo(trial_record)
 
             if self.use_min:
                 scores.append(min_score)
             else:
                 scores.append(total_score)
-            self.b = copy.deepcopy(saved_board)
+            self.b.undo(move_record)
 
         return self.b.possible_moves()[scores.index(max(scores))]
 
+    def sharded_scores(self):
+        """ Runs the trials of each possible move in seeded shards and
+        returns the "sum" or "min" score of each move.
+
+        Every move gets a fresh SeedSequence from seed, and each shard
+        of each direction a child of it, so the scores only depend on
+        the seed and the moves made so far."""
+        moves = self.b.possible_moves()
+        n_shards = -(-self.trials // self.shard_size)
+        shard_seeds = self.seed_seq.spawn(1)[0].spawn(len(DIRS) * n_shards)
+
+        tasks = []
+        for d in moves:
+            record = self.b.make_move(d)
+            board = bitboard.to_bitboard(self.b.grid)
+            score = int(self.b.score)
+            self.b.undo(record)
+            k = DIRS.index(d)
+            for shard in range(n_shards):
+                trials = min(self.shard_size,
+                             self.trials - shard * self.shard_size)
+                tasks.append((board, score, self.b.prob_2, self.max_depth,
+                              trials, shard_seeds[k * n_shards + shard]))
+
+        if self.workers == 1:
+            results = [_rollout_shard(*task) for task in tasks]
+        else:
+            if self.pool is None:
+                self.pool = ProcessPoolExecutor(max_workers=self.workers)
+            results = list(self.pool.map(_rollout_shard, *zip(*tasks)))
+
+        scores = []
+        for i in range(len(moves)):
+            shards = results[i * n_shards:(i + 1) * n_shards]
+            self.rollout_steps += sum(steps for _, _, steps in shards)
+            if self.use_min:
+                scores.append(min(low for _, low, _ in shards))
+            else:
+                scores.append(sum(total for total, _, _ in shards))
+        return scores
+
+    def batch_scores(self):
+        """ Runs the trials of every possible move in lock step as one
+        BoardBatch and returns the "sum" or "min" score of each move.
+
+        Each step makes a uniformly random legal move on every game that
+        is still going and adds a tile.  Games that are over stay in the
+        batch but are masked out of the remaining steps."""
+        moves = self.b.possible_moves()
+        grids = []
+        scores = []
+        for d in moves:
+            record = self.b.make_move(d)
+            grids.append(self.b.grid.copy())
+            scores.append(self.b.score)
+            self.b.undo(record)
+        batch = BoardBatch.from_grids(np.repeat(grids, self.trials, axis=0),
+                                      np.repeat(scores, self.trials),
+                                      self.b.prob_2, self.seed_seq.spawn(1)[0])
+
+        for j in range(self.max_depth):
+            legal = batch.possible_moves()
+            alive = legal.any(axis=1)
+            if not alive.any():
+                break
+            # the legal move with the largest random key is a uniformly
+            # random legal move
+            keys = np.where(legal, batch.rng.random(legal.shape), -1)
+            batch.turn(np.argmax(keys, axis=1), alive)
+            self.rollout_steps += int(alive.sum())
+
+        final = batch.score.reshape(len(moves), self.trials)
+        if self.use_min:
+            return final.min(axis=1).tolist()
+        else:
+            return final.sum(axis=1).tolist()
+
+    def search_stats(self):
+        return {"rollout_steps": self.rollout_steps}
+
 class ExpectimaxPlayer(Player):
     """ An expectimax tree search player for 2048.
 
@@ -111,7 +310,7 @@ class ExpectimaxPlayer(Player):
     the score, and the number of tiles that are out of order (monotonicity)
 
     The weights for the heuristic are just an initial guess and
-    need to be tuned. Ideas to consider are increasing the penalty
+    need to be tuned, which py2048.tuner does. Ideas to consider are increasing the penalty
     for tiles being out of order, and possibly only considering either
     the horizontal or vertical direction.  Maybe adding a bonus for
     high tiles to be on edges and in corners.
@@ -127,65 +326,415 @@ class ExpectimaxPlayer(Player):
         Weight vector to calculate the total for the heuristic evaluation
 
     h_exp : numpy.array
-        Vector of the exponent for each heuristic value
+        Vector of the exponent for each heuristic value.  4x4 boards
+        are evaluated with the tables of an Evaluator, which is rebuilt
+        when h_weights or h_exp change.
+
+    tt_size : int or None
+        Maximum number of entries in the transposition table that caches
+        the value of each searched node.  None turns the table off.
+        The table is emptied at the start of every move unless
+        reuse_tree is set.
+
+    tt_policy : str
+        Eviction policy of the transposition table, "lru" or "fifo"
+
+    prob_cutoff : float or None
+        Chance nodes reached with a cumulative spawn probability below
+        this value are evaluated with the heuristic instead of being
+        expanded.  None expands every chance node.
+
+    max_cells : int or None
+        Chance nodes with more empty tiles than this only expand a
+        random sample of max_cells of them.  None expands every empty
+        tile.  With both prob_cutoff and max_cells left as None the
+        search is exact.
+
+    seed : int or None
+        Seed of the sampling of empty tiles.  The sample of a chance
+        node only depends on the seed and the grid, so the serial and
+        the parallel search expand the same tiles.  None draws a seed
+        from np.random when the search first needs one, like Board, so
+        np.random.seed still fixes the game.
+
+    time_limit : float or None
+        Seconds allowed per move.  When set, the search deepens one turn
+        at a time from depth 1 and returns the best move of the last
+        depth that finished before the time ran out, ignoring depth.
+        Depth 1 is always finished.
+
+    workers : int or None
+        Number of processes searching the root moves in parallel.  The
+        pool is started on the first move and kept until close is
+        called.  None searches in this process.
+
+    split_chance : bool
+        With workers, also split the first chance layer so every
+        (move, empty tile, tile value) child is a separate task, which
+        balances the load better than one task per move.
+
+    reuse_tree : bool
+        Keep the transposition table between moves.  The board after
+        the real move and spawn was a node of the last search, one
+        turn shallower, so its subtree is already in the table.  With
+        time_limit, iterative deepening gets every depth the last
+        search finished from the table and its time goes to the next
+        depth.  Only helps with time_limit: a fixed depth search keys
+        its nodes by the depth left, which the next search never asks
+        for again.  Stale entries are left for the table's eviction to
+        drop.  Needs tt_size.  Nodes below a prob_cutoff are keyed by
+        their probability from the root, so they are rarely reused.
+
+    book : str, py2048.book.Book or None
+        Book of precomputed moves, or the path of one, checked before
+        searching.  Positions found in it are answered without a
+        search.
+
+    Attributes
+    ----------
+    depth_reached : int
+        Depth of the search that picked the last move
+    nodes_searched : int
+        Number of nodes visited while picking the last move, including
+        the nodes of unfinished iterations
+    search_time : float
+        Seconds spent picking the last move
     """
 
     def __init__(self, depth,
-                 h_weights=np.array([-0.1, 40, -1, 1]),
-                 h_exp=np.array([1, 0.5, 1, 1])):
+                 h_weights=DEFAULT_H_WEIGHTS,
+                 h_exp=DEFAULT_H_EXP,
+                 tt_size=None, tt_policy="lru",
+                 prob_cutoff=None, max_cells=None, seed=None,
+                 time_limit=None, workers=None, split_chance=False,
+                 reuse_tree=False, book=None):
+        if reuse_tree and tt_size is None:
+            raise Exception("reuse_tree needs a transposition table, set tt_size")
         self.depth = depth
+        self._evaluator = None
         self.h_weights = h_weights
         self.h_exp = h_exp
+        if tt_size is None:
+            self.tt = None
+        else:
+            self.tt = TranspositionTable(tt_size, tt_policy)
+        self.prob_cutoff = prob_cutoff
+        self.max_cells = max_cells
+        self._seed = seed
+        self.time_limit = time_limit
+        self.deadline = None
+        self.depth_reached = 0
+        self.nodes_searched = 0
+        self.search_time = 0.0
+        self.workers = workers
+        self.split_chance = split_chance
+        self.reuse_tree = reuse_tree
+        if isinstance(book, str):
+            from py2048.book import Book
+            book = Book(book)
+        self.book = book
+        self._tt_evaluator = None
+        self._tt_counts = (0, 0)
+        self._table_depth = 0
+        self.pool = None
 
         self.b = Board()
 
+    @property
+    def h_weights(self):
+        return self._h_weights
+
+    @h_weights.setter
+    def h_weights(self, h_weights):
+        self._h_weights = np.array(h_weights, dtype=float)
+        self._evaluator = None
+
+    @property
+    def h_exp(self):
+        return self._h_exp
+
+    @h_exp.setter
+    def h_exp(self, h_exp):
+        self._h_exp = np.array(h_exp, dtype=float)
+        self._evaluator = None
+
+    @property
+    def seed(self):
+        if self._seed is None:
+            self._seed = int(np.random.randint(2**31))
+        return self._seed
+
+    def evaluator(self):
+        """ The Evaluator for the current weights, rebuilt when they were
+        replaced or changed in place """
+        if (self._evaluator is None or
+                not self._evaluator.matches(self.h_weights, self.h_exp)):
+            self._evaluator = Evaluator(self.h_weights, self.h_exp)
+        return self._evaluator
+
+    def worker_settings(self):
+        """ The arguments to rebuild this player's search in a worker """
+        return dict(h_weights=tuple(self.h_weights),
+                    h_exp=tuple(self.h_exp),
+                    tt_size=None if self.tt is None else self.tt.size,
+                    tt_policy="lru" if self.tt is None else self.tt.policy,
+                    prob_cutoff=self.prob_cutoff,
+                    max_cells=self.max_cells,
+                    seed=self.seed)
+
     def next_move(self):
         """ Determine the next move using the expectimax function.  Alters
-        the depth of search based on how many tiles are currently empty."""
+        the depth of search based on how many tiles are currently empty,
+        or deepens until the time limit when there is one.  Positions in
+        the book are answered from it."""
 
-        saved_board = copy.deepcopy(self.b)
-        scores = []
+        start = time.perf_counter()
+        if self.book is not None:
+            entry = self.book.lookup(self.b.grid)
+            if entry is not None:
+                self.nodes_searched = 0
+                self.depth_reached = 0
+                self.search_time = time.perf_counter() - start
+                return entry[0]
+        evaluator = self.evaluator()
+        if self.tt is not None:
+            if self.reuse_tree and evaluator is self._tt_evaluator:
+                self._table_depth = self.depth_reached
+            else:
+                self.tt.clear()
+                self._table_depth = 0
+            self._tt_evaluator = evaluator
+            self._tt_counts = (self.tt.hits, self.tt.misses)
+        self.nodes_searched = 0
+        if self.time_limit is None:
+            self.depth_reached = self.search_depth()
+            scores = self.search_root(self.depth_reached)
+        else:
+            scores = self.iterative_deepening(start + self.time_limit)
+        self.search_time = time.perf_counter() - start
+
+        return self.b.possible_moves()[scores.index(max(scores))]
+
+    def search_stats(self):
+        stats = {"nodes": self.nodes_searched,
+                 "depth": self.depth_reached,
+                 "search_time": self.search_time}
+        if self.tt is not None:
+            stats["tt_hits"] = self.tt.hits - self._tt_counts[0]
+            stats["tt_misses"] = self.tt.misses - self._tt_counts[1]
+        return stats
+
+    def search_depth(self):
+        """ The depth to search to, one more than depth on crowded boards
+        and one less on open boards."""
         if self.b.n_empty_tiles() >= 10:
-            depth = self.depth -1
+            return self.depth - 1
         elif self.b.n_empty_tiles() <= 5:
-            depth = self.depth + 1
+            return self.depth + 1
         else:
-            depth = self.depth
+            return self.depth
+
+    def search_root(self, depth):
+        """ Returns the expectimax value of each possible move """
+        if self.workers is not None:
+            return self.parallel_search_root(depth)
+
+        scores = []
         for d in self.b.possible_moves():
-            self.b.move(d)
+            record = self.b.make_move(d)
             scores.append(self.expectimax("add", depth))
-            self.b = copy.deepcopy(saved_board)
+            self.b.undo(record)
+        return scores
 
-        return self.b.possible_moves()[scores.index(max(scores))]
+    def parallel_search_root(self, depth):
+        """ search_root on the worker pool.
+
+        Each worker keeps its own player with the same settings, and
+        the values of the split chance layer are combined the same way
+        as in expectimax, so the move values match the serial search.
+        """
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(max_workers=self.workers)
+        settings = self.worker_settings()
+        if self.deadline is None:
+            wall_deadline = None
+        else:
+            # perf_counter values don't carry across processes, and a
+            # task can wait in the queue, so the workers get the
+            # deadline itself in wall clock time
+            wall_deadline = time.time() + self.deadline - time.perf_counter()
+
+        def submit(grid, turn, task_depth, prob):
+            return self.pool.submit(_expectimax_task, type(self), settings,
+                                    grid, self.b.score, self.b.prob_2, turn,
+                                    task_depth, prob, wall_deadline)
+
+        jobs = []
+        for d in self.b.possible_moves():
+            record = self.b.make_move(d)
+            if not self.split_chance or depth == 0:
+                jobs.append(submit(self.b.grid.copy(), "add", depth, 1.0))
+                self.b.undo(record)
+                continue
+
+            cells, n_cells = self.chance_cells()
+            futures = []
+            for i in cells:
+                outcome = []
+                for tile, tile_prob in [(2, self.b.prob_2),
+                                        (4, 1 - self.b.prob_2)]:
+                    grid = self.b.grid.copy()
+                    grid[i] = tile
+                    outcome.append(submit(grid, "move", depth - 1,
+                                          tile_prob / n_cells))
+                futures.append(outcome)
+            jobs.append(futures)
+            self.b.undo(record)
 
-    def expectimax(self, turn, depth):
+        def result(future):
+            value, nodes = future.result()
+            self.nodes_searched += nodes
+            return value
+
+        scores = []
+        timed_out = False
+        for job in jobs:
+            if isinstance(job, list):
+                # count the chance node itself, like expectimax would
+                self.nodes_searched += 1
+                outcomes = [(result(two), result(four)) for two, four in job]
+                if any(v is None for pair in outcomes for v in pair):
+                    timed_out = True
+                else:
+                    scores.append(self.chance_value(outcomes, self.b.prob_2))
+            else:
+                value = result(job)
+                timed_out = timed_out or value is None
+                scores.append(value)
+        if timed_out:
+            raise SearchTimeout()
+        return scores
+
+    def iterative_deepening(self, deadline):
+        """ Searches with increasing depth until deadline, a
+        time.perf_counter value, and returns the move values of the
+        deepest finished search.
+
+        Stops early once a deeper search visits no more nodes than the
+        one before, as the game ends inside the search.  Depths kept in
+        the table from the last move (see reuse_tree) visit only a few
+        nodes, so they don't count for the stop."""
+        scores = self.search_root(1)
+        self.depth_reached = 1
+        last_nodes = self.nodes_searched
+
+        record = self.b.save()
+        self.deadline = deadline
+        try:
+            for depth in range(2, MAX_ITERATIVE_DEPTH + 1):
+                start_nodes = self.nodes_searched
+                scores = self.search_root(depth)
+                self.depth_reached = depth
+                nodes = self.nodes_searched - start_nodes
+                if depth > self._table_depth and nodes <= last_nodes:
+                    break
+                last_nodes = nodes
+        except SearchTimeout:
+            pass
+        finally:
+            self.deadline = None
+            self.b.undo(record)
+
+        return scores
+
+    def expectimax(self, turn, depth, prob=1.0):
         """ Uses a version of expectiminmax algorithm to evaluate the board.
         Only performs max and random steps because there is no opposing player.
+
+        prob is the probability of the spawns that led to this node,
+        which is compared against prob_cutoff.
+
+        Node values are looked up in the transposition table first when
+        there is one.  The key holds the score as well as the grid since
+        the score is part of the evaluation, and prob when there is a
+        cutoff since it decides how far the node is expanded.
+
+        Raises SearchTimeout when the deadline of an iterative deepening
+        search has passed.
         """
+        self.nodes_searched += 1
+        if (self.deadline is not None and self.nodes_searched % 64 == 0 and
+                time.perf_counter() > self.deadline):
+            raise SearchTimeout()
+
+        if self.tt is None:
+            return self._expectimax(turn, depth, prob)
+
+        key = (self.b.grid.tobytes(), self.b.score, turn, depth)
+        if self.prob_cutoff is not None:
+            key += (prob,)
+        value = self.tt.get(key)
+        if value is None:
+            value = self._expectimax(turn, depth, prob)
+            self.tt.put(key, value)
+        return value
 
+    def _expectimax(self, turn, depth, prob):
         if depth == 0:
             return self.evaluate_board()
         elif turn == "move":
             if self.b.check_game_over():
                 return self.evaluate_board()
-            saved_board = copy.deepcopy(self.b)
             scores = []
             for d in self.b.possible_moves():
-                self.b.move(d)
-                scores.append(self.expectimax("add", depth))
-                self.b = copy.deepcopy(saved_board)
+                record = self.b.make_move(d)
+                scores.append(self.expectimax("add", depth, prob))
+                self.b.undo(record)
             return max(scores)
         elif turn == "add":
-            twos = []
-            fours = []
-            for i in self.b.empty_tiles():
-                self.b.grid[i] = 2
-                twos.append(self.expectimax("move", depth-1))
-                self.b.grid[i] = 4
-                fours.append(self.expectimax("move", depth-1))
-                self.b.grid[i] = 1
+            if self.prob_cutoff is not None and prob < self.prob_cutoff:
+                return self.evaluate_board()
+            cells, n_cells = self.chance_cells()
+            prob_2 = self.b.prob_2
+            outcomes = []
+            for i in cells:
+                record = self.b.place_tile(i, 2)
+                two = self.expectimax("move", depth-1, prob * prob_2 / n_cells)
+                self.b.place_tile(i, 4)
+                four = self.expectimax("move", depth-1,
+                                       prob * (1 - prob_2) / n_cells)
+                self.b.undo(record)
+                outcomes.append((two, four))
+
+            return self.chance_value(outcomes, prob_2)
 
-            return 0.9 * np.sum(twos) + 0.1 * np.sum(fours)
+    def chance_cells(self):
+        """ Returns the empty tiles expanded by a chance node, sampled
+        down to max_cells, along with the number of empty tiles.
+
+        The sample is drawn from a generator seeded with seed and the
+        grid, so a node is sampled the same way wherever it is
+        searched."""
+        cells = self.b.empty_tiles()
+        n_cells = len(cells)
+        if self.max_cells is not None and n_cells > self.max_cells:
+            rng = np.random.default_rng([self.seed,
+                                         zlib.crc32(self.b.grid.tobytes())])
+            picks = rng.choice(n_cells, self.max_cells, replace=False)
+            cells = [cells[k] for k in sorted(picks)]
+        return cells, n_cells
+
+    @staticmethod
+    def chance_value(outcomes, prob_2):
+        """ Expected value of a chance node from the (2, 4) values of
+        each of its expanded tiles.
+
+        Each empty tile is equally likely, so the expectation is the
+        mean over the tiles of the 2 and 4 outcomes."""
+        total = 0
+        for two, four in outcomes:
+            total += prob_2 * two + (1 - prob_2) * four
+        return total / len(outcomes)
 
     def evaluate_board(self):
         return self.board_options()
@@ -193,13 +742,353 @@ class ExpectimaxPlayer(Player):
     def board_options(self):
         """ Uses a combination of four heuristics to evaluate the board: 
         the score of the game, the smoothness of the board, the number of
-        empty tiles and the number of tiles that are out of place"""
+        empty tiles and the number of tiles that are out of place
+
+        4x4 boards are evaluated with the tables of the Evaluator, which
+        gives the same value as the heuristics computed on the grid."""
         
+        exponents = tables.cell_exponents(self.b.grid)
+        if exponents is not None:
+            if self._evaluator is None:
+                self._evaluator = Evaluator(self.h_weights, self.h_exp)
+            return self._evaluator.evaluate(exponents, self.b.score)
+
         h = np.array([self.b.smoothness(), self.b.n_empty_tiles(),
                       self.b.n_out_of_order(), self.b.score])
         return self.h_weights.dot(h**self.h_exp)
 
 
+# kinds of MCTS nodes
+DECISION = 0
+CHANCE = 1
+# node pool arrays, with the dtype of each
+NODE_FIELDS = [("board", np.uint64), ("score", np.int64),
+               ("visits", np.int64), ("total", np.float64),
+               ("first_child", np.int32), ("next_sibling", np.int32),
+               ("label", np.int8), ("kind", np.int8)]
+
+
+class NodePool:
+    """ Preallocated arrays holding the nodes of an MCTS tree.
+
+    Node k is index k of every array.  The children of a node are a
+    linked list through first_child and next_sibling, -1 ending it.
+    The label of a chance node is the index in DIRS of the move that
+    led to it, the label of a decision node the spawn that led to it,
+    cell index | 16 for a 4.
+
+    Parameters
+    ----------
+    size : int
+        Maximum number of nodes, nothing is allocated after this
+    """
+    def __init__(self, size):
+        self.size = size
+        for name, dtype in NODE_FIELDS:
+            setattr(self, name, np.zeros(size, dtype=dtype))
+        self.n = 0
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name, _ in NODE_FIELDS)
+
+    def add(self, board, score, kind, label, parent):
+        """ Adds a node as the first child of parent, -1 for none, and
+        returns its index, or -1 when the pool is full """
+        k = self.n
+        if k == self.size:
+            return -1
+        self.n = k + 1
+        self.board[k] = board
+        self.score[k] = score
+        self.visits[k] = 0
+        self.total[k] = 0.0
+        self.first_child[k] = -1
+        self.label[k] = label
+        self.kind[k] = kind
+        if parent >= 0:
+            self.next_sibling[k] = self.first_child[parent]
+            self.first_child[parent] = k
+        else:
+            self.next_sibling[k] = -1
+        return k
+
+    def children(self, k):
+        child = int(self.first_child[k])
+        while child >= 0:
+            yield child
+            child = int(self.next_sibling[child])
+
+    def keep_subtree(self, root, other):
+        """ Copies the subtree under root into the NodePool other,
+        with root as node 0, and returns other """
+        order = [root]
+        for k in order:
+            order.extend(self.children(k))
+        order = np.array(order)
+        new_index = np.full(self.n + 1, -1, dtype=np.int32)
+        new_index[order] = np.arange(len(order))
+        for name, _ in NODE_FIELDS:
+            getattr(other, name)[:len(order)] = getattr(self, name)[order]
+        # -1 links index the last entry of new_index, which stays -1
+        other.first_child[:len(order)] = new_index[self.first_child[order]]
+        other.next_sibling[:len(order)] = new_index[self.next_sibling[order]]
+        other.next_sibling[0] = -1
+        other.n = len(order)
+        return other
+
+
+class MCTSPlayer(Player):
+    """ A Monte Carlo tree search player for 2048.
+
+    Decision nodes, where a move is picked, choose their child by UCT.
+    Chance nodes, where a tile spawns, sample a spawn and only add a new
+    child while they have fewer than widening[0] * visits**widening[1]
+    of them (progressive widening), otherwise the sampled spawn is
+    followed if it is a child already and an existing child is picked
+    in proportion to its visits if not.  A new node is valued with one
+    random rollout of at most rollout_depth turns, by its final score.
+
+    The nodes live in a NodePool of max_nodes nodes allocated up front.
+    Once it is full the search goes on without adding nodes, so the
+    memory of the tree never grows past it.  Between moves the subtree
+    under the real move and spawn is kept and the rest is dropped.
+    Plays 4x4 boards only.
+
+    Parameters
+    ----------
+    iterations : int or None
+        Search iterations per move.  None searches until time_limit, or
+        for DEFAULT_MCTS_ITERATIONS when there is no time_limit either.
+    time_limit : float or None
+        Seconds per move.  With both budgets the search stops at the
+        first one reached.
+    max_nodes : int
+        Size of the node pool, two of which are allocated to copy the
+        kept subtree between moves
+    exploration : float
+        UCT exploration constant, relative to the root's mean value
+    widening : (float, float)
+        Progressive widening constant and exponent of chance nodes
+    rollout_depth : int
+        Maximum turns of the rollout of a new node
+    reuse_tree : bool
+        Keep the subtree of the real move and spawn between moves
+    seed : int or None
+        Seed of the spawns and the rollouts of the search
+
+    Attributes
+    ----------
+    iterations_run : int
+        Iterations of the search for the last move
+    search_time : float
+        Seconds spent picking the last move
+    """
+
+    def __init__(self, iterations=None, time_limit=None, max_nodes=100000,
+                 exploration=1.0, widening=(1.0, 0.5), rollout_depth=10,
+                 reuse_tree=True, seed=None):
+        if iterations is None and time_limit is None:
+            iterations = DEFAULT_MCTS_ITERATIONS
+        self.iterations = iterations
+        self.time_limit = time_limit
+        self.exploration = exploration
+        self.widening = widening
+        self.rollout_depth = rollout_depth
+        self.reuse_tree = reuse_tree
+        self.rng = np.random.default_rng(seed)
+        self.nodes = NodePool(max_nodes)
+        self._spare = NodePool(max_nodes)
+        self.iterations_run = 0
+        self.search_time = 0.0
+
+        self.b = Board()
+
+    def _root(self):
+        """ Index of the root for the current board, keeping the
+        subtree of the last search when the board is one of its nodes """
+        board = tables.cell_exponents(self.b.grid)
+        if board is None:
+            raise Exception("MCTSPlayer only plays 4x4 boards")
+        board = sum([e << (4 * k) for k, e in enumerate(board)])
+        score = int(self.b.score)
+
+        p = self.nodes
+        if self.reuse_tree and p.n:
+            for chance in p.children(0):
+                for k in p.children(chance):
+                    if int(p.board[k]) == board and int(p.score[k]) == score:
+                        self.nodes = p.keep_subtree(k, self._spare)
+                        self._spare = p
+                        return 0
+        p.n = 0
+        p.add(board, score, DECISION, -1, -1)
+        return 0
+
+    def next_move(self):
+        """ Searches until the budget runs out and returns the most
+        visited move of the root """
+        start = time.perf_counter()
+        deadline = None if self.time_limit is None else start + self.time_limit
+        root = self._root()
+        i = 0
+        while self.iterations is None or i < self.iterations:
+            if deadline is not None and time.perf_counter() > deadline:
+                break
+            self.iterate(root)
+            i += 1
+        self.iterations_run = i
+        self.search_time = time.perf_counter() - start
+
+        p = self.nodes
+        best = max(p.children(root), key=lambda k: p.visits[k])
+        return DIRS[p.label[best]]
+
+    def search_stats(self):
+        return {"iterations": self.iterations_run,
+                "nodes": self.nodes.n,
+                "search_time": self.search_time}
+
+    def iterate(self, root):
+        """ One selection, expansion, rollout and backup from root """
+        p = self.nodes
+        k = root
+        path = [k]
+        while p.visits[k] > 0:
+            if p.kind[k] == DECISION:
+                if p.first_child[k] < 0 and not self._expand(k):
+                    break
+                child = self._select(k)
+            else:
+                child = self._sample_spawn(k)
+            if child < 0:
+                break
+            k = child
+            path.append(k)
+
+        value = _rollout_shard(int(p.board[k]), int(p.score[k]),
+                               self.b.prob_2, self.rollout_depth, 1,
+                               self.rng)[0]
+        for k in path:
+            p.visits[k] += 1
+            p.total[k] += value
+
+    def _expand(self, k):
+        """ Adds a chance child for each legal move of decision node k,
+        returns whether it has any """
+        p = self.nodes
+        board = int(p.board[k])
+        score = int(p.score[k])
+        added = False
+        for d in bitboard.possible_moves(board):
+            moved, gained = bitboard.move(board, d)
+            if p.add(moved, score + gained, CHANCE, DIRS.index(d), k) < 0:
+                break
+            added = True
+        return added
+
+    def _select(self, k):
+        """ The UCT child of decision node k """
+        p = self.nodes
+        children = list(p.children(k))
+        visits = p.visits[children]
+        if visits.min() == 0:
+            return children[int(np.argmin(visits))]
+        means = p.total[children] / visits
+        scale = max(1.0, p.total[k] / p.visits[k])
+        uct = means + self.exploration * scale * np.sqrt(
+            np.log(p.visits[k]) / visits)
+        return children[int(np.argmax(uct))]
+
+    def _sample_spawn(self, k):
+        """ The child of chance node k to follow, adding it if
+        progressive widening allows.  -1 when the pool is full. """
+        p = self.nodes
+        board = int(p.board[k])
+        cells = bitboard.empty_cells(board)
+        cell = cells[int(self.rng.random() * len(cells))]
+        exponent = 1 if self.rng.random() < self.b.prob_2 else 2
+        label = cell | (16 if exponent == 2 else 0)
+
+        children = list(p.children(k))
+        for child in children:
+            if p.label[child] == label:
+                return child
+        c, alpha = self.widening
+        if (not children or len(children) < c * p.visits[k] ** alpha):
+            return p.add(board | (exponent << (4 * cell)), int(p.score[k]),
+                         DECISION, label, k)
+        visits = p.visits[children].astype(float)
+        return children[int(self.rng.choice(len(children),
+                                            p=visits / visits.sum()))]
+
+
+def _rollout_shard(board, score, prob_2, max_depth, trials, seed):
+    """ Plays trials random games of at most max_depth turns from the
+    bitboard board, the same way as MCPlayer.next_move.
+
+    seed is anything np.random.default_rng accepts.  Returns the total
+    and the minimum final score of the games and the number of turns
+    played.
+    """
+    rng = np.random.default_rng(seed)
+    total = 0
+    lowest = None
+    steps = 0
+    for i in range(trials):
+        b = board
+        s = score
+        for j in range(max_depth):
+            moves = bitboard.possible_moves(b)
+            if not moves:
+                break
+            b, gained = bitboard.move(b, moves[rng.integers(len(moves))])
+            s += gained
+            b = bitboard.add_random_tile(b, prob_2, rng)
+            steps += 1
+        total += s
+        if lowest is None or s < lowest:
+            lowest = s
+    return total, lowest, steps
+
+
+_worker_player = None
+
+
+def _expectimax_task(cls, settings, grid, score, prob_2, turn, depth, prob,
+                     wall_deadline):
+    """ Evaluates one node of a parallel root search in a worker process.
+
+    The worker's player is built on the first task and kept while the
+    settings stay the same.  Returns (value, nodes searched), with a
+    value of None if wall_deadline, a time.time value, passed first.
+    """
+    global _worker_player
+    if (_worker_player is None or type(_worker_player) is not cls or
+            _worker_player.worker_settings() != settings):
+        kwargs = dict(settings)
+        kwargs["h_weights"] = np.array(settings["h_weights"])
+        kwargs["h_exp"] = np.array(settings["h_exp"])
+        _worker_player = cls(0, **kwargs)
+
+    if wall_deadline is not None:
+        time_left = wall_deadline - time.time()
+        if time_left <= 0:
+            return None, 0
+    p = _worker_player
+    p.b = Board.from_grid(grid, score, prob_2)
+    p.nodes_searched = 0
+    if wall_deadline is not None:
+        p.deadline = time.perf_counter() + time_left
+    try:
+        value = p.expectimax(turn, depth, prob)
+    except SearchTimeout:
+        value = None
+    finally:
+        p.deadline = None
+    return value, p.nodes_searched
+
+
 if __name__ == "__main__":
     p = ExpectimaxPlayer(2)
     p.play(verbose=True)
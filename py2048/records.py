@@ -0,0 +1,211 @@
+"""Compact binary records of played 4x4 games
+
+A record file holds any number of games back to back after an 8 byte
+magic header.  Each game is
+
+    seed          uint64
+    n_turns       uint32
+    n_tiles       uint8    number of tiles on the starting board
+    tiles         n_tiles bytes, one spawn code per starting tile
+    turns         n_turns bytes, one turn code per turn
+
+all little-endian.  A spawn code holds the cell index (row * 4 + column)
+in bits 0-3 and a 1 in bit 4 when the tile is a 4.  A turn code is the
+spawn code of the tile added after the move, with the index of the move
+in DIRS in bits 5-6.  So a game takes one byte per turn plus a 13 byte
+header, and the whole game can be replayed from it.
+
+The offset of every finished game is appended to an index file next to
+the records, path + ".idx", as a uint64.  A game is only in the index
+once all of it has been written, and opening a writer drops anything
+after the last indexed game, so an interrupted write loses at most the
+game being written.  A writer that finds the records without their
+index rebuilds it from the game headers.  The reader memory maps both
+files and replays single games on demand.
+"""
+
+import os
+import struct
+
+import numpy as np
+
+from py2048.board import Board, DIRS, PROB_2
+
+MAGIC = b"P2048R\x01\x00"
+GAME_HEADER = struct.Struct("<QIB")
+RECORD_GRID_SIZE = (4, 4)
+
+
+def index_path(path):
+    return path + ".idx"
+
+
+def spawn_code(i, value):
+    """Encodes a tile of value at position i of a 4x4 grid"""
+    return (i[0] * RECORD_GRID_SIZE[1] + i[1]) | (0x10 if value == 4 else 0)
+
+
+def decode_spawn(code):
+    """Returns the position and value of a spawn or turn code"""
+    return divmod(code & 0xF, RECORD_GRID_SIZE[1]), 4 if code & 0x10 else 2
+
+
+def scan_offsets(path):
+    """Offsets of the complete games of a record file, found by walking
+    the game headers, to rebuild a lost index"""
+    size = os.path.getsize(path)
+    offsets = []
+    offset = len(MAGIC)
+    with open(path, "rb") as f:
+        f.seek(offset)
+        while offset + GAME_HEADER.size <= size:
+            seed, n_turns, n_tiles = GAME_HEADER.unpack(
+                f.read(GAME_HEADER.size))
+            end = offset + GAME_HEADER.size + n_tiles + n_turns
+            if end > size:
+                break
+            offsets.append(offset)
+            offset = end
+            f.seek(offset)
+    return np.array(offsets, dtype="<u8")
+
+
+class RecordWriter:
+    """Appends games to a record file
+
+    Example Usage:
+    >>> with RecordWriter("games.rec") as w:
+    ...     Player().play(recorder=w)
+
+    Parameters
+    ----------
+    path : str
+        The record file, created if it doesn't exist
+    """
+    def __init__(self, path):
+        self.path = path
+        end = len(MAGIC)
+        if os.path.exists(path) and os.path.getsize(path):
+            with open(path, "rb") as f:
+                if f.read(len(MAGIC)) != MAGIC:
+                    raise Exception("%s is not a game record file" % path)
+            if os.path.exists(index_path(path)):
+                offsets = np.fromfile(index_path(path), dtype="<u8")
+                with open(index_path(path), "rb+") as f:
+                    f.truncate(8 * len(offsets))
+            else:
+                offsets = scan_offsets(path)
+                offsets.tofile(index_path(path))
+            if len(offsets):
+                with open(path, "rb") as f:
+                    f.seek(int(offsets[-1]))
+                    seed, n_turns, n_tiles = GAME_HEADER.unpack(
+                        f.read(GAME_HEADER.size))
+                end = int(offsets[-1]) + GAME_HEADER.size + n_tiles + n_turns
+        else:
+            with open(path, "wb") as f:
+                f.write(MAGIC)
+            open(index_path(path), "wb").close()
+
+        self.data = open(path, "rb+")
+        self.data.truncate(end)
+        self.data.seek(end)
+        self.index = open(index_path(path), "ab")
+        self.game = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def begin_game(self, board, seed=None):
+        """Starts a game from the tiles on board, recorded with seed,
+        or with the seed of board when seed is None"""
+        if board.grid.shape != RECORD_GRID_SIZE:
+            raise Exception("Only 4x4 games can be recorded")
+        tiles = bytearray(spawn_code(i, board.grid[i])
+                          for i in zip(*np.where(board.grid != 1)))
+        if seed is None:
+            seed = board.seed
+        self.game = (seed, tiles, bytearray())
+
+    def record_turn(self, d, i, value):
+        """Records the move d followed by a tile of value added at i"""
+        self.game[2].append(spawn_code(i, value) | (DIRS.index(d) << 5))
+
+    def end_game(self):
+        """Writes the game and adds it to the index"""
+        seed, tiles, turns = self.game
+        offset = self.data.tell()
+        self.data.write(GAME_HEADER.pack(seed, len(turns), len(tiles)))
+        self.data.write(tiles)
+        self.data.write(turns)
+        self.data.flush()
+        self.index.write(struct.pack("<Q", offset))
+        self.index.flush()
+        self.game = None
+
+    def close(self):
+        self.data.close()
+        self.index.close()
+
+
+class RecordReader:
+    """Reads games from a record file without loading it
+
+    Parameters
+    ----------
+    path : str
+        The record file
+    prob_2 : numeric in [0,1]
+        prob_2 of the boards returned by position
+    """
+    def __init__(self, path, prob_2=PROB_2):
+        self.prob_2 = prob_2
+        self.data = np.memmap(path, dtype=np.uint8, mode="r")
+        if bytes(self.data[:len(MAGIC)]) != MAGIC:
+            raise Exception("%s is not a game record file" % path)
+        if os.path.getsize(index_path(path)):
+            self.offsets = np.memmap(index_path(path), dtype="<u8", mode="r")
+        else:
+            self.offsets = np.zeros(0, dtype="<u8")
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def _header(self, game):
+        offset = int(self.offsets[game])
+        seed, n_turns, n_tiles = GAME_HEADER.unpack(
+            bytes(self.data[offset:offset + GAME_HEADER.size]))
+        start = offset + GAME_HEADER.size
+        return seed, start, n_tiles, n_turns
+
+    def seed(self, game):
+        return self._header(game)[0]
+
+    def n_turns(self, game):
+        return self._header(game)[3]
+
+    def turns(self, game):
+        """Returns the moves of game and the (position, value) of the
+        tile added after each one"""
+        seed, start, n_tiles, n_turns = self._header(game)
+        codes = self.data[start + n_tiles:start + n_tiles + n_turns]
+        return ([DIRS[code >> 5] for code in codes.tolist()],
+                [decode_spawn(code) for code in codes.tolist()])
+
+    def position(self, game, turn=None):
+        """Replays game up to turn turns, or to the end when turn is
+        None, and returns the Board"""
+        seed, start, n_tiles, n_turns = self._header(game)
+        if turn is None:
+            turn = n_turns
+        b = Board.from_grid(np.ones(RECORD_GRID_SIZE), prob_2=self.prob_2)
+        for code in self.data[start:start + n_tiles].tolist():
+            b.place_tile(*decode_spawn(code))
+        turn_start = start + n_tiles
+        for code in self.data[turn_start:turn_start + turn].tolist():
+            b.move(DIRS[code >> 5])
+            b.place_tile(*decode_spawn(code))
+        return b
@@ -0,0 +1,445 @@
+"""An asyncio service that hosts many games and batches their searches
+
+GameService keeps any number of games and picks their moves with one
+player configuration (see tournament.make_player).  Requests for a
+move don't search straight away: they wait in a queue, and the
+scheduler takes every request that arrives within max_wait seconds, up
+to max_batch of them, and sends them to the worker pool as a few
+chunks.  While a batch is being searched the next one is already being
+collected, so with many sessions the pool stays busy and throughput
+grows with the number of sessions rather than being set by the
+latency of one request.
+
+The service can be used in process, by awaiting its methods, or over a
+local socket with one JSON object per line.  A request is
+
+    {"id": 7, "op": "step", "game": 3}
+
+with op one of "create" (optional "seed"), "step" (optional "move",
+searched for when missing), "play" (steps until the game is over),
+"state" and "close", and the reply is
+
+    {"id": 7, "ok": true, "result": {...}}
+
+or {"id": 7, "ok": false, "error": "..."}.  Requests on one connection
+are answered as they finish, not in order, so a client can keep many
+in flight.  ServiceClient is such a client, with the same methods as
+GameService, and load_test drives either one with concurrent sessions.
+
+Usage:
+    python -m py2048.service serve --player ExpectimaxPlayer \\
+        --kwargs '{"depth": 1}' --port 2048
+    python -m py2048.service load --port 2048 --sessions 64 --moves 20
+    python -m py2048.service load --in-process --sessions 64 --moves 20
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from py2048.board import Board
+from py2048.tournament import make_player
+
+DEFAULT_CONFIG = {"player": "ExpectimaxPlayer", "kwargs": {"depth": 1}}
+DEFAULT_PORT = 2048
+
+_service_player = None
+_service_config = None
+
+
+def _next_moves(config, boards):
+    """Picks the next move of every (grid, score, prob_2) in boards in
+    a worker, with a player built from config and kept between calls"""
+    global _service_player, _service_config
+    if _service_player is None or _service_config != config:
+        _service_player = make_player(config)
+        _service_config = config
+    p = _service_player
+    moves = []
+    for grid, score, prob_2 in boards:
+        p.b = Board.from_grid(grid, score, prob_2)
+        moves.append(p.next_move())
+    return moves
+
+
+class Session:
+    """One game hosted by the service"""
+    def __init__(self, game, seed):
+        self.game = game
+        self.board = Board(seed=seed)
+        self.moves = 0
+        self.lock = asyncio.Lock()
+
+    def state(self):
+        return {"game": self.game,
+                "grid": self.board.grid.astype(int).tolist(),
+                "score": int(self.board.score),
+                "moves": self.moves,
+                "game_over": bool(self.board.game_over),
+                "seed": self.board.seed}
+
+
+class GameService:
+    """Hosts games and picks their moves in batches on a worker pool
+
+    Example Usage:
+    >>> async with GameService(workers=4) as service:
+    ...     game = await service.create_game(seed=1)
+    ...     state = await service.play(game)
+
+    Parameters
+    ----------
+    config : dict or None
+        Player configuration, see tournament.make_player
+    workers : int or None
+        Number of worker processes, None for one per CPU
+    max_batch : int
+        Most move requests searched in one batch
+    max_wait : float
+        Seconds the scheduler waits for more requests to join a batch
+    executor : concurrent.futures.Executor or None
+        Pool to search on instead of starting a process pool
+
+    Attributes
+    ----------
+    n_requests, n_batches : int
+        Number of move requests searched, and in how many batches
+    """
+    def __init__(self, config=None, workers=None, max_batch=64,
+                 max_wait=0.002, executor=None):
+        self.config = DEFAULT_CONFIG if config is None else config
+        self.workers = workers
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.executor = executor
+        self._own_executor = executor is None
+        self.sessions = {}
+        self._ids = itertools.count()
+        self._queue = None
+        self._scheduler = None
+        self.n_requests = 0
+        self.n_batches = 0
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    async def start(self):
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        if self.workers is None:
+            self.workers = getattr(self.executor, "_max_workers", 1)
+        self._queue = asyncio.Queue()
+        self._scheduler = asyncio.ensure_future(self._schedule())
+
+    async def close(self):
+        """Stops the scheduler and the pool it started"""
+        if self._scheduler is not None:
+            self._scheduler.cancel()
+            try:
+                await self._scheduler
+            except asyncio.CancelledError:
+                pass
+            self._scheduler = None
+        if self._own_executor and self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    def _session(self, game):
+        if game not in self.sessions:
+            raise Exception("No game %r" % game)
+        return self.sessions[game]
+
+    async def create_game(self, seed=None):
+        """Starts a game and returns its id"""
+        game = next(self._ids)
+        self.sessions[game] = Session(game, seed)
+        return game
+
+    async def state(self, game):
+        return self._session(game).state()
+
+    async def close_game(self, game):
+        return self.sessions.pop(game).state()
+
+    async def next_move(self, board):
+        """Queues board for the next batch and returns its move"""
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait(((board.grid, board.score, board.prob_2),
+                                future))
+        return await future
+
+    async def step(self, game, move=None):
+        """Plays one turn of game, with move or the player's move, and
+        returns the new state"""
+        s = self._session(game)
+        async with s.lock:
+            if s.board.game_over:
+                raise Exception("Game %r is over" % game)
+            if move is None:
+                move = await self.next_move(s.board)
+            elif move not in s.board.possible_moves():
+                raise Exception("Illegal move %r" % (move,))
+            s.board.turn(move)
+            s.moves += 1
+            return s.state()
+
+    async def play(self, game, max_moves=None):
+        """Steps game until it is over, or for max_moves turns"""
+        s = self._session(game)
+        state = s.state()
+        while not state["game_over"] and (max_moves is None or
+                                          state["moves"] < max_moves):
+            state = await self.step(game)
+        return state
+
+    async def _schedule(self):
+        """Collects move requests into batches and searches each batch
+        on the pool while collecting the next"""
+        loop = asyncio.get_running_loop()
+        in_flight = set()
+        try:
+            while True:
+                batch = [await self._queue.get()]
+                deadline = loop.time() + self.max_wait
+                while len(batch) < self.max_batch:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(),
+                                                            timeout))
+                    except asyncio.TimeoutError:
+                        break
+                self.n_batches += 1
+                self.n_requests += len(batch)
+                task = asyncio.ensure_future(self._search(batch))
+                in_flight.add(task)
+                task.add_done_callback(in_flight.discard)
+        finally:
+            for task in in_flight:
+                task.cancel()
+
+    async def _search(self, batch):
+        """Splits batch into one chunk per worker and resolves the
+        futures of the requests with the moves"""
+        loop = asyncio.get_running_loop()
+        n_chunks = max(1, min(self.workers, len(batch)))
+        chunks = [batch[k::n_chunks] for k in range(n_chunks)]
+        jobs = [loop.run_in_executor(self.executor, _next_moves, self.config,
+                                     [board for board, _ in chunk])
+                for chunk in chunks]
+        for chunk, job in zip(chunks, jobs):
+            try:
+                moves = await job
+            except Exception as e:
+                for _, future in chunk:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future), move in zip(chunk, moves):
+                if not future.done():
+                    future.set_result(move)
+
+
+async def _handle(service, reader, writer):
+    """Answers the JSON line requests of one connection"""
+    write_lock = asyncio.Lock()
+    tasks = set()
+
+    async def answer(request):
+        reply = {"id": request.get("id")}
+        try:
+            op = request["op"]
+            if op == "create":
+                result = await service.create_game(request.get("seed"))
+            elif op == "step":
+                result = await service.step(request["game"],
+                                            request.get("move"))
+            elif op == "play":
+                result = await service.play(request["game"],
+                                            request.get("max_moves"))
+            elif op == "state":
+                result = await service.state(request["game"])
+            elif op == "close":
+                result = await service.close_game(request["game"])
+            else:
+                raise Exception("Unknown op %r" % (op,))
+            reply["ok"] = True
+            reply["result"] = result
+        except Exception as e:
+            reply["ok"] = False
+            reply["error"] = str(e)
+        async with write_lock:
+            writer.write((json.dumps(reply) + "\n").encode())
+            await writer.drain()
+
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            task = asyncio.ensure_future(answer(json.loads(line)))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks)
+    finally:
+        writer.close()
+
+
+async def serve(service, host="127.0.0.1", port=DEFAULT_PORT):
+    """Starts a server for service, returns the asyncio Server"""
+    return await asyncio.start_server(
+        lambda reader, writer: _handle(service, reader, writer), host, port)
+
+
+class ServiceClient:
+    """Talks to a served GameService, with the same methods
+
+    Parameters
+    ----------
+    host, port : str, int
+        Address of the server
+    """
+    def __init__(self, host="127.0.0.1", port=DEFAULT_PORT):
+        self.host = host
+        self.port = port
+        self._ids = itertools.count()
+        self._pending = {}
+        self._reader_task = None
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    async def connect(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host,
+                                                                 self.port)
+        self._reader_task = asyncio.ensure_future(self._read())
+
+    async def close(self):
+        self.writer.close()
+        await self._reader_task
+
+    async def _read(self):
+        while True:
+            line = await self.reader.readline()
+            if not line:
+                break
+            reply = json.loads(line)
+            future = self._pending.pop(reply["id"])
+            if reply["ok"]:
+                future.set_result(reply["result"])
+            else:
+                future.set_exception(Exception(reply["error"]))
+        for future in self._pending.values():
+            future.set_exception(Exception("Connection closed"))
+
+    async def request(self, op, **args):
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        request = dict(args, id=request_id, op=op)
+        self.writer.write((json.dumps(request) + "\n").encode())
+        await self.writer.drain()
+        return await future
+
+    async def create_game(self, seed=None):
+        return await self.request("create", seed=seed)
+
+    async def step(self, game, move=None):
+        return await self.request("step", game=game, move=move)
+
+    async def play(self, game, max_moves=None):
+        return await self.request("play", game=game, max_moves=max_moves)
+
+    async def state(self, game):
+        return await self.request("state", game=game)
+
+    async def close_game(self, game):
+        return await self.request("close", game=game)
+
+
+async def load_test(api, n_sessions, n_moves, seed=0):
+    """Plays n_sessions games at once for at most n_moves turns each
+    through api, a GameService or a ServiceClient.
+
+    Returns : dict of the number of turns, the seconds taken, turns per
+    second and quantiles of the latency of a turn"""
+    latencies = []
+
+    async def session(k):
+        game = await api.create_game(seed + k)
+        state = await api.state(game)
+        while not state["game_over"] and state["moves"] < n_moves:
+            start = time.perf_counter()
+            state = await api.step(game)
+            latencies.append(time.perf_counter() - start)
+        await api.close_game(game)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[session(k) for k in range(n_sessions)])
+    seconds = time.perf_counter() - start
+    return {"sessions": n_sessions,
+            "turns": len(latencies),
+            "seconds": seconds,
+            "turns_per_second": len(latencies) / seconds,
+            "latency_p50": float(np.percentile(latencies, 50)),
+            "latency_p99": float(np.percentile(latencies, 99))}
+
+
+async def _serve_forever(config, args):
+    async with GameService(config, args.workers, args.max_batch) as service:
+        server = await serve(service, args.host, args.port)
+        async with server:
+            await server.serve_forever()
+
+
+async def _load(config, args):
+    if args.in_process:
+        async with GameService(config, args.workers, args.max_batch) as api:
+            return await load_test(api, args.sessions, args.moves)
+    async with ServiceClient(args.host, args.port) as api:
+        return await load_test(api, args.sessions, args.moves)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("command", choices=["serve", "load"])
+    parser.add_argument("--player", default=DEFAULT_CONFIG["player"],
+                        help="class name from py2048.players")
+    parser.add_argument("--kwargs", default=json.dumps(DEFAULT_CONFIG["kwargs"]),
+                        help="JSON object of arguments for the player")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--max-batch", type=int, default=64)
+    parser.add_argument("--sessions", type=int, default=32,
+                        help="concurrent games of the load test")
+    parser.add_argument("--moves", type=int, default=20,
+                        help="turns per game of the load test")
+    parser.add_argument("--in-process", action="store_true",
+                        help="load test a service in this process")
+    args = parser.parse_args(argv)
+
+    config = {"player": args.player, "kwargs": json.loads(args.kwargs)}
+    if args.command == "serve":
+        asyncio.run(_serve_forever(config, args))
+    else:
+        print(json.dumps(asyncio.run(_load(config, args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""Precomputed row transition tables for 4x4 boards
+
+A row of a 4x4 board holds 4 tiles, and with tiles stored as 4-bit log2
+exponents (0 for an empty space) a row fits in 16 bits.  There are only
+65536 such rows, so the result of moving every one of them left or
+right, the score gained and whether the row changes can all be
+computed once and looked up afterwards.  Nibble j of a row code holds
+the exponent in column j, so a left move slides tiles towards nibble 0.
+
+The tables are built the first time row_tables is called.
+
+Because of the 4-bit cells the largest tile is 2**15 = 32768.  Two
+32768 tiles do not merge in the tables, so callers fall back to the
+general code when a row holds one.
+"""
+
+import numpy as np
+
+ROW_LEN = 4
+TABLE_GRID_SIZE = (ROW_LEN, ROW_LEN)
+N_ROWS = 1 << (4 * ROW_LEN)
+MAX_EXPONENT = 15
+
+# multiply a row of exponents with this to get its row code
+ROW_WEIGHTS = np.array([1 << (4 * j) for j in range(ROW_LEN)])
+ROW_SHIFTS = np.array([4 * j for j in range(ROW_LEN)])
+
+# exponent of each tile value the tables can move, with 1 for a blank
+# space.  Float keys as Board grids are float, int tiles still match.
+EXPONENT_OF = dict((float(2 ** e) if e else 1.0, e)
+                   for e in range(MAX_EXPONENT))
+
+_TABLES = None
+
+
+def _compact(lines):
+    """Moves the non-zero entries of each line to the front, keeping
+    their order"""
+    order = np.argsort(lines == 0, axis=1, kind="stable")
+    return np.take_along_axis(lines, order, axis=1)
+
+
+def slide_lines(lines):
+    """Slides every line of exponents towards index 0, merging tiles
+    with the same rules as Board.move
+
+    Parameters
+    ----------
+    lines : ndarray
+        (n, ROW_LEN) array of exponents
+
+    Returns : (ndarray, ndarray, ndarray) the moved lines, the score
+    gained and the number of merges for each line
+    """
+    compact = _compact(lines)
+    merge = np.zeros(compact.shape, dtype=bool)
+    for k in range(ROW_LEN - 1):
+        merge[:, k] = ((compact[:, k] == compact[:, k + 1]) &
+                       (compact[:, k] != 0) &
+                       (compact[:, k] < MAX_EXPONENT))
+        if k > 0:
+            merge[:, k] &= ~merge[:, k - 1]
+
+    merged = np.where(merge, compact + 1, compact)
+    # the tile that merged into its neighbour leaves an empty space
+    merged[:, 1:][merge[:, :-1]] = 0
+    score = np.sum(np.where(merge, 2 ** (compact + 1), 0), axis=1)
+
+    return _compact(merged), score, np.sum(merge, axis=1)
+
+
+def pack_rows(lines):
+    """Converts an (..., ROW_LEN) array of exponents into row codes"""
+    return np.asarray(lines, dtype=np.int64).dot(ROW_WEIGHTS)
+
+
+def unpack_rows(codes):
+    """Converts an array of row codes into an (..., ROW_LEN) array of
+    exponents"""
+    return (np.asarray(codes, dtype=np.int64)[..., None] >> ROW_SHIFTS) & 0xF
+
+
+class RowTables:
+    """Lookup tables indexed by row code
+
+    Attributes
+    ----------
+    left, right : ndarray
+        row code after moving the row left or right
+    score : ndarray
+        score gained by moving the row (the same for left and right)
+    changed_left, changed_right : ndarray
+        whether moving the row left or right changes it
+    merges : ndarray
+        number of merges made by moving the row
+    left_lines, right_lines : ndarray
+        (N_ROWS, ROW_LEN) uint8 exponents of the row after moving it left
+        or right, for looking up many rows at once
+    left_list, right_list, score_list, merges_list : list
+    changed_left_list, changed_right_list : list
+        python list copies of the tables above, which are faster to
+        index with python ints
+    values_list : list
+        tuple of the tile values in the row, using 1 for blank spaces
+    """
+    def __init__(self):
+        rows = np.arange(N_ROWS)
+        lines = unpack_rows(rows)
+
+        moved, score, merges = slide_lines(lines)
+        self.left = pack_rows(moved)
+        self.score = score
+        self.merges = merges
+
+        self.left_lines = moved.astype(np.uint8)
+
+        moved, _, _ = slide_lines(lines[:, ::-1])
+        self.right = pack_rows(moved[:, ::-1])
+        self.right_lines = moved[:, ::-1].astype(np.uint8)
+
+        self.changed_left = self.left != rows
+        self.changed_right = self.right != rows
+        self.changed_left_list = self.changed_left.tolist()
+        self.changed_right_list = self.changed_right.tolist()
+
+        self.left_list = self.left.tolist()
+        self.right_list = self.right.tolist()
+        self.score_list = self.score.tolist()
+        self.merges_list = self.merges.tolist()
+        self.values_list = [tuple(v) for v in
+                            np.where(lines == 0, 1, 2 ** lines).tolist()]
+
+
+def row_tables():
+    """Returns the RowTables, building them on the first call"""
+    global _TABLES
+    if _TABLES is None:
+        _TABLES = RowTables()
+    return _TABLES
+
+
+def cell_exponents(grid):
+    """Returns the exponents of a grid in the Board layout as a flat
+    list, or None if the grid can't be moved with the tables.
+
+    Works on python values as the numpy overhead is larger than the
+    work for a 4x4 grid.
+    """
+    if grid.shape != TABLE_GRID_SIZE:
+        return None
+    try:
+        return [EXPONENT_OF[v] for v in grid.ravel().tolist()]
+    except KeyError:
+        return None
+
+
+def row_codes(e):
+    """Row codes of the rows of a flat list of exponents"""
+    return [e[0] | e[1] << 4 | e[2] << 8 | e[3] << 12,
+            e[4] | e[5] << 4 | e[6] << 8 | e[7] << 12,
+            e[8] | e[9] << 4 | e[10] << 8 | e[11] << 12,
+            e[12] | e[13] << 4 | e[14] << 8 | e[15] << 12]
+
+
+def col_codes(e):
+    """Row codes of the columns of a flat list of exponents"""
+    return [e[0] | e[4] << 4 | e[8] << 8 | e[12] << 12,
+            e[1] | e[5] << 4 | e[9] << 8 | e[13] << 12,
+            e[2] | e[6] << 4 | e[10] << 8 | e[14] << 12,
+            e[3] | e[7] << 4 | e[11] << 8 | e[15] << 12]
+
+
+def grid_exponents(grid):
+    """Converts a grid in the Board layout (1s for blank spaces) into an
+    int array of log2 exponents (0 for blank spaces)"""
+    return np.log2(grid).astype(np.int64)
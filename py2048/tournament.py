@@ -0,0 +1,143 @@
+"""Plays many seeded games of one player configuration on a process pool
+
+Each finished game is appended to a JSONL file as soon as it completes,
+one JSON object per line with the game number, its seed, the final
+score, the largest tile, the number of moves and the seconds it took.
+Running the same tournament again with the same file skips the games
+already in it, so an interrupted run picks up where it stopped.
+
+The seed of a game only depends on the tournament seed and the game
+number, so a game plays the same way whichever worker runs it and
+whether or not the tournament was resumed.  It seeds the random tiles
+of the board and the global np.random state some players use.
+
+Usage:
+    python -m py2048.tournament --player ExpectimaxPlayer \\
+        --kwargs '{"depth": 1}' --games 1000 --output results.jsonl
+"""
+
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from py2048 import players
+
+
+def make_player(config):
+    """Builds a player from a config dict with the name of a class in
+    py2048.players under "player" and its arguments under "kwargs\""""
+    cls = getattr(players, config["player"])
+    return cls(**config.get("kwargs", {}))
+
+
+def game_seed(seed, game):
+    """The seed of game number game of a tournament with seed"""
+    return int(np.random.SeedSequence([seed, game]).generate_state(1)[0])
+
+
+def play_game(config, game, seed, max_moves=None):
+    """Plays one game, stopped after max_moves moves unless it's None,
+    and returns its result as a dict"""
+    np.random.seed(seed)
+    p = make_player(config)
+    p.reset_board(seed)
+    try:
+        result = p.play(max_moves=max_moves)
+    finally:
+        p.close()
+    result["game"] = game
+    result["seed"] = seed
+    return result
+
+
+def completed_games(path):
+    """Returns the results already in the JSONL file at path.
+
+    A last line cut off by an interruption is removed from the file so
+    that new results start on a fresh line."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, "rb+") as f:
+        data = f.read()
+        end = data.rfind(b"\n") + 1
+        if end != len(data):
+            f.truncate(end)
+    results = {}
+    for line in data[:end].splitlines():
+        if line.strip():
+            result = json.loads(line)
+            results[result["game"]] = result
+    return results
+
+
+def run_tournament(config, n_games, path, seed=0, workers=None):
+    """Plays games 0 to n_games - 1 that aren't already in the file at
+    path and appends each result to it as it finishes.
+
+    Parameters
+    ----------
+    config : dict
+        Player configuration, see make_player
+    n_games : int
+        Number of games in the tournament
+    path : str
+        JSONL file the results are streamed to
+    seed : int
+        Seed of the tournament
+    workers : int or None
+        Number of processes, None for one per CPU
+
+    Returns : list of the results of all n_games games, ordered by game
+    """
+    results = completed_games(path)
+    todo = [g for g in range(n_games) if g not in results]
+
+    with open(path, "a") as f:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(play_game, config, g, game_seed(seed, g))
+                       for g in todo]
+            for future in as_completed(futures):
+                result = future.result()
+                f.write(json.dumps(result) + "\n")
+                f.flush()
+                results[result["game"]] = result
+
+    return [results[g] for g in range(n_games)]
+
+
+def summarize(results):
+    """Mean, median and max of the scores and the share of games that
+    reached each max tile"""
+    scores = np.array([r["score"] for r in results])
+    tiles = [r["max_tile"] for r in results]
+    return {"games": len(results),
+            "mean_score": float(scores.mean()),
+            "median_score": float(np.median(scores)),
+            "max_score": int(scores.max()),
+            "max_tiles": dict((str(t), tiles.count(t) / len(tiles))
+                              for t in sorted(set(tiles)))}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--player", required=True,
+                        help="class name from py2048.players")
+    parser.add_argument("--kwargs", default="{}",
+                        help="JSON object of arguments for the player")
+    parser.add_argument("--games", type=int, required=True)
+    parser.add_argument("--output", required=True, help="JSONL results file")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    config = {"player": args.player, "kwargs": json.loads(args.kwargs)}
+    results = run_tournament(config, args.games, args.output, args.seed,
+                             args.workers)
+    print(json.dumps(summarize(results), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""A bounded transposition table for the tree search players"""
+
+from collections import OrderedDict
+
+POLICIES = ["lru", "fifo"]
+
+
+class TranspositionTable:
+    """Maps search nodes to their values, evicting old entries once the
+    table is full.
+
+    With the "lru" policy the least recently used entry is evicted, with
+    "fifo" the oldest inserted entry is evicted regardless of how often
+    it was used.
+
+    Parameters
+    ----------
+    size : int
+        Maximum number of entries kept in the table
+    policy : str
+        Eviction policy, either "lru" or "fifo"
+
+    Attributes
+    ----------
+    hits : int
+        Number of lookups that found an entry
+    misses : int
+        Number of lookups that didn't find an entry
+    evictions : int
+        Number of entries removed to make room for new ones
+    """
+    def __init__(self, size, policy="lru"):
+        if size < 1:
+            raise Exception("Transposition table size must be positive")
+        if policy not in POLICIES:
+            raise Exception("Incorrect policy arg, must be either 'lru' or 'fifo'")
+        self.size = size
+        self.policy = policy
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def get(self, key):
+        """Returns the value stored for key, or None if there isn't one"""
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        if self.policy == "lru":
+            self.entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        """Stores value for key, evicting an entry if the table is full"""
+        if key in self.entries:
+            self.entries[key] = value
+            if self.policy == "lru":
+                self.entries.move_to_end(key)
+            return
+        if len(self.entries) >= self.size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+        self.entries[key] = value
+
+    def clear(self):
+        """Removes all the entries, keeping the counters"""
+        self.entries.clear()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
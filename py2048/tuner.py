@@ -0,0 +1,200 @@
+"""Tunes the ExpectimaxPlayer heuristic weights by playing games
+
+Each generation perturbs the best h_weights and h_exp found so far into
+a population of candidates and plays every candidate on the same set
+of seeded games.  Using the same games for every candidate pairs the
+noise of the random tiles, so a candidate that scores higher did
+better on the very same games rather than on easier ones.  The games
+of a generation run on a process pool.
+
+Perturbations are multiplicative, w * exp(sigma * N(0, 1)), so every
+weight keeps its sign and its scale.  With the "es" strategy sigma
+grows when more than a fifth of a generation beats the best and
+shrinks otherwise (the 1/5 success rule).  With "random" it stays
+fixed, which makes it a plain random search around the best.
+
+After every generation the state, the random generator included, is
+written to a JSON checkpoint.  Running again with the same checkpoint
+continues from the last finished generation and gives the same result
+as a run that was never stopped.
+
+Usage:
+    python -m py2048.tuner --generations 20 --population 8 --games 16 \\
+        --depth 1 --max-moves 200 --checkpoint tune.json
+"""
+
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from py2048.players import DEFAULT_H_WEIGHTS, DEFAULT_H_EXP
+from py2048.tournament import game_seed, play_game
+
+STRATEGIES = ["es", "random"]
+N_WEIGHTS = len(DEFAULT_H_WEIGHTS)
+# 1/5 success rule step of sigma for the "es" strategy
+SIGMA_STEP = 1.22
+
+
+def split_params(params):
+    """The h_weights and h_exp lists of a parameter vector"""
+    params = [float(x) for x in params]
+    return params[:N_WEIGHTS], params[N_WEIGHTS:]
+
+
+def perturb(params, sigma, rng):
+    """Multiplies every parameter by exp(sigma * N(0, 1))"""
+    params = np.asarray(params, dtype=float)
+    return params * np.exp(sigma * rng.standard_normal(len(params)))
+
+
+def evaluate(candidates, player_kwargs, seeds, pool, max_moves=None):
+    """Plays every candidate parameter vector on every seed.
+
+    Returns : (n_candidates, n_seeds) array of the final scores"""
+    futures = []
+    for params in candidates:
+        h_weights, h_exp = split_params(params)
+        kwargs = dict(player_kwargs, h_weights=h_weights, h_exp=h_exp)
+        config = {"player": "ExpectimaxPlayer", "kwargs": kwargs}
+        futures.append([pool.submit(play_game, config, g, seed, max_moves)
+                        for g, seed in enumerate(seeds)])
+    return np.array([[f.result()["score"] for f in row] for row in futures])
+
+
+def save_checkpoint(path, state):
+    """Writes state as JSON, replacing the old file only once the new
+    one is complete"""
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp, path)
+
+
+def load_checkpoint(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def tune(n_generations, population, n_games, player_kwargs=None,
+         max_moves=None, sigma=0.2, strategy="es", seed=0, workers=None,
+         checkpoint=None, h_weights=DEFAULT_H_WEIGHTS, h_exp=DEFAULT_H_EXP):
+    """Searches for better ExpectimaxPlayer heuristic weights.
+
+    Parameters
+    ----------
+    n_generations : int
+        Total number of generations, including any already in the
+        checkpoint
+    population : int
+        Number of candidates per generation
+    n_games : int
+        Number of seeded games every candidate plays
+    player_kwargs : dict or None
+        Other ExpectimaxPlayer arguments, depth 1 when None
+    max_moves : int or None
+        Games are stopped after this many moves, None plays them out
+    sigma : float
+        Initial scale of the perturbations
+    strategy : str
+        "es" or "random", see the module docstring
+    seed : int
+        Seed of the games and of the perturbations
+    workers : int or None
+        Number of processes, None for one per CPU
+    checkpoint : str or None
+        JSON file the state is saved to after every generation, and
+        resumed from when it exists
+    h_weights, h_exp : array like
+        Starting point of the search
+
+    Returns : dict of the state, with the best h_weights, h_exp and mean
+    score under "best"
+    """
+    if strategy not in STRATEGIES:
+        raise Exception("Incorrect strategy arg, must be either 'es' or 'random'")
+    if player_kwargs is None:
+        player_kwargs = {"depth": 1}
+    settings = {"population": population, "n_games": n_games,
+                "player_kwargs": player_kwargs, "max_moves": max_moves,
+                "strategy": strategy, "seed": seed}
+    seeds = [game_seed(seed, g) for g in range(n_games)]
+    rng = np.random.default_rng(seed)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        if checkpoint is not None and os.path.exists(checkpoint):
+            state = load_checkpoint(checkpoint)
+            if state["settings"] != settings:
+                raise Exception("Checkpoint %s was made with other settings"
+                                % checkpoint)
+            rng.bit_generator.state = state["rng"]
+        else:
+            params = list(h_weights) + list(h_exp)
+            scores = evaluate([params], player_kwargs, seeds, pool, max_moves)[0]
+            w, e = split_params(params)
+            state = {"settings": settings, "generation": 0, "sigma": sigma,
+                     "best": {"h_weights": w, "h_exp": e,
+                              "score": float(scores.mean()),
+                              "scores": scores.tolist()},
+                     "history": []}
+
+        while state["generation"] < n_generations:
+            best = state["best"]
+            best_params = best["h_weights"] + best["h_exp"]
+            candidates = [perturb(best_params, state["sigma"], rng)
+                          for k in range(population)]
+            scores = evaluate(candidates, player_kwargs, seeds, pool, max_moves)
+            means = scores.mean(axis=1)
+            # paired comparison, every candidate played the best's games
+            n_better = int(np.sum(means > best["score"]))
+
+            top = int(np.argmax(means))
+            if means[top] > best["score"]:
+                w, e = split_params(candidates[top])
+                state["best"] = {"h_weights": w, "h_exp": e,
+                                 "score": float(means[top]),
+                                 "scores": scores[top].tolist()}
+            state["history"].append({"generation": state["generation"],
+                                     "sigma": state["sigma"],
+                                     "mean_scores": means.tolist(),
+                                     "best_score": state["best"]["score"]})
+            if strategy == "es":
+                if n_better > population / 5:
+                    state["sigma"] *= SIGMA_STEP
+                else:
+                    state["sigma"] /= SIGMA_STEP
+            state["generation"] += 1
+            state["rng"] = rng.bit_generator.state
+            if checkpoint is not None:
+                save_checkpoint(checkpoint, state)
+
+    return state
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--generations", type=int, required=True)
+    parser.add_argument("--population", type=int, default=8)
+    parser.add_argument("--games", type=int, default=16,
+                        help="seeded games per candidate, default %(default)s")
+    parser.add_argument("--depth", type=int, default=1)
+    parser.add_argument("--max-moves", type=int, default=None,
+                        help="stop games after this many moves")
+    parser.add_argument("--sigma", type=float, default=0.2)
+    parser.add_argument("--strategy", choices=STRATEGIES, default="es")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--checkpoint", help="JSON checkpoint to save and resume")
+    args = parser.parse_args(argv)
+
+    state = tune(args.generations, args.population, args.games,
+                 {"depth": args.depth}, args.max_moves, args.sigma,
+                 args.strategy, args.seed, args.workers, args.checkpoint)
+    print(json.dumps(state["best"], indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,10 @@
+import numpy as np
+
+
+def random_grids(n, size=(4, 4), max_exponent=7, blank=0.3, seed=0):
+    """n random grids of the given size in the Board layout, with tiles
+    up to 2**max_exponent and about a blank fraction of empty cells"""
+    rng = np.random.RandomState(seed)
+    exponents = rng.randint(0, max_exponent + 1, size=(n,) + tuple(size))
+    exponents[rng.random_sample(exponents.shape) < blank] = 0
+    return np.where(exponents == 0, 1, 2.0 ** exponents)
@@ -0,0 +1,81 @@
+import numpy as np
+from py2048.board import Board, DIRS
+from py2048.batch import BoardBatch
+from tests.helpers import random_grids
+
+
+def test_grids_round_trip():
+    grids = random_grids(50)
+    batch = BoardBatch.from_grids(grids)
+    assert np.all(batch.grids == grids)
+
+
+def test_move_matches_board():
+    grids = random_grids(200)
+    b = Board()
+    for k, d in enumerate(DIRS):
+        batch = BoardBatch.from_grids(grids)
+        changed = batch.move(d)
+        for grid, new_grid, score, c in zip(grids, batch.grids, batch.score,
+                                            changed):
+            b.grid = grid.copy()
+            b.score = 0
+            assert c == b.move(d, check_only=True)
+            b.move(d)
+            assert np.all(b.grid == new_grid)
+            assert b.score == score
+
+
+def test_move_per_board_directions():
+    grids = random_grids(200)
+    dirs = np.random.RandomState(1).randint(0, 4, size=len(grids))
+    dirs[:10] = -1
+    batch = BoardBatch.from_grids(grids)
+    batch.move(dirs)
+    b = Board()
+    for grid, d, new_grid in zip(grids, dirs, batch.grids):
+        b.grid = grid.copy()
+        if d >= 0:
+            b.move(DIRS[d])
+        assert np.all(b.grid == new_grid)
+
+
+def test_possible_moves_and_game_over():
+    grids = np.concatenate([random_grids(100),
+                            [[[2, 4, 2, 4],
+                              [4, 2, 4, 2],
+                              [2, 4, 2, 4],
+                              [4, 2, 4, 2]]]])
+    batch = BoardBatch.from_grids(grids)
+    legal = batch.possible_moves()
+    over = batch.check_game_over()
+    b = Board()
+    for grid, row, o in zip(grids, legal, over):
+        b.grid = grid.copy()
+        assert [d for d, ok in zip(DIRS, row) if ok] == b.possible_moves()
+        assert o == b.check_game_over()
+    assert over[-1]
+
+
+def test_add_random_tile():
+    batch = BoardBatch(1000, seed=0)
+    assert np.all(batch.n_empty_tiles() == 14)
+    assert set(np.unique(batch.exponents)) == {0, 1, 2}
+    # roughly PROB_2 of the tiles are 2s
+    assert 0.85 < np.mean(batch.exponents[batch.exponents > 0] == 1) < 0.95
+
+    mask = np.arange(1000) % 2 == 0
+    batch.add_random_tile(mask)
+    assert np.all(batch.n_empty_tiles()[mask] == 13)
+    assert np.all(batch.n_empty_tiles()[~mask] == 14)
+
+
+def test_seeded_batches_match():
+    a = BoardBatch(100, seed=3)
+    b = BoardBatch(100, seed=3)
+    for _ in range(20):
+        dirs = np.argmax(a.possible_moves(), axis=1)
+        a.turn(dirs)
+        b.turn(dirs)
+    assert np.all(a.exponents == b.exponents)
+    assert np.all(a.score == b.score)
@@ -0,0 +1,23 @@
+import numpy as np
+from py2048 import bench
+
+
+def test_positions_are_seeded():
+    grids, scores = bench.make_positions(20, seed=1)
+    grids2, scores2 = bench.make_positions(20, seed=1)
+    assert np.all(grids == grids2)
+    assert np.all(scores == scores2)
+    assert grids.shape == (20, 4, 4)
+
+
+def test_compare():
+    baseline = {"results": {"a": {"seconds_per_op": 1.0},
+                            "b": {"seconds_per_move": 2.0},
+                            "c": {"seconds_per_op": 1.0}}}
+    results = {"results": {"a": {"seconds_per_op": 1.1},
+                           "b": {"seconds_per_move": 3.0},
+                           "d": {"seconds_per_op": 5.0}}}
+    regressions = bench.compare(results, baseline, threshold=0.2)
+    assert [r[0] for r in regressions] == ["b"]
+    assert regressions[0][3] == 1.5
+    assert bench.missing_baselines(results, baseline) == ["d"]
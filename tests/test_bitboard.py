@@ -0,0 +1,69 @@
+import numpy as np
+from py2048.board import Board, DIRS
+from py2048 import bitboard
+from tests.helpers import random_grids
+
+
+def test_round_trip():
+    for grid in random_grids(20):
+        assert np.all(bitboard.to_grid(bitboard.to_bitboard(grid)) == grid)
+
+
+def test_transpose():
+    for grid in random_grids(20):
+        board = bitboard.to_bitboard(grid)
+        assert np.all(bitboard.to_grid(bitboard.transpose(board)) == grid.T)
+
+
+def test_move_matches_board():
+    b = Board()
+    for grid in random_grids(200):
+        board = bitboard.to_bitboard(grid)
+        for d in DIRS:
+            b.grid = grid.copy()
+            b.score = 0
+            b.move(d)
+            new_board, score = bitboard.move(board, d)
+            assert np.all(bitboard.to_grid(new_board) == b.grid)
+            assert score == b.score
+
+
+def test_possible_moves_and_game_over():
+    b = Board()
+    grids = list(random_grids(100)) + [np.array([[2, 4, 2, 4],
+                                                 [4, 2, 4, 2],
+                                                 [2, 4, 2, 4],
+                                                 [4, 2, 4, 2]])]
+    for grid in grids:
+        b.grid = grid.copy()
+        board = bitboard.to_bitboard(grid)
+        assert bitboard.possible_moves(board) == b.possible_moves()
+        assert bitboard.check_game_over(board) == b.check_game_over()
+        assert bitboard.n_empty(board) == b.n_empty_tiles()
+        assert ([divmod(k, 4) for k in bitboard.empty_cells(board)] ==
+                b.empty_tiles())
+
+
+def test_add_random_tile():
+    rng = np.random.default_rng(0)
+    board = bitboard.to_bitboard(np.array([[2, 1, 1, 1],
+                                           [1, 1, 1, 1],
+                                           [1, 1, 1, 1],
+                                           [1, 1, 1, 2]]))
+    for _ in range(50):
+        new_board = bitboard.add_random_tile(board, rng=rng)
+        assert bitboard.n_empty(new_board) == 13
+        assert new_board & board == board
+        added = new_board ^ board
+        k = (added.bit_length() - 1) // 4
+        assert added >> (4 * k) in (1, 2)
+
+
+def test_bitboard_game():
+    bb = bitboard.BitBoard()
+    assert bb.n_empty_tiles() == 14
+    while not bb.game_over:
+        bb.turn(bb.possible_moves()[0])
+    b = bb.to_board()
+    assert b.check_game_over()
+    assert b.score == bb.score
@@ -173,9 +173,47 @@ def test_empty_tiles():
     assert b.empty_tiles() == []
 
 def test_add_random_tile():
-    # don't test this method currently.
-    # would need to be tightly coupled to implementation details
-    pass
+    b = Board.from_grid(np.ones(GRID_SIZE), seed=0)
+    for n in range(GRID_SIZE[0] * GRID_SIZE[1]):
+        record = b.add_random_tile()
+        assert b.grid[record[1]] in (2, 4)
+        assert b.n_empty_tiles() == GRID_SIZE[0] * GRID_SIZE[1] - n - 1
+
+def test_seeded_boards_play_the_same_game():
+    a = Board(seed=5)
+    b = Board(seed=5)
+    assert np.all(a.grid == b.grid)
+    for i in range(300):
+        moves = a.possible_moves()
+        if moves == []:
+            break
+        a.turn(moves[0])
+        b.turn(moves[0])
+        assert np.all(a.grid == b.grid)
+    assert a.score == b.score
+
+    # tiles placed from another rng don't change the board's own tiles
+    c = Board(seed=5)
+    c.undo(c.add_random_tile(np.random.default_rng(1)))
+    d = Board(seed=5)
+    assert c.add_random_tile() == d.add_random_tile()
+
+def test_default_seed_follows_np_random():
+    np.random.seed(3)
+    a = Board()
+    np.random.seed(3)
+    b = Board()
+    assert a.seed == b.seed
+    assert np.all(a.grid == b.grid)
+
+def test_from_grid_leaves_np_random_alone():
+    np.random.seed(3)
+    b = Board.from_grid(np.ones((4, 4)))
+    assert np.random.randint(2**31) == np.random.RandomState(3).randint(2**31)
+    # the seed is drawn once a tile is added
+    np.random.seed(3)
+    b.add_random_tile()
+    assert b.seed == np.random.RandomState(3).randint(2**31)
 
 def test_turn():
     # don't test this method currently.
@@ -379,3 +417,69 @@ def test_n_out_of_order():
                        [2, 4, 4, 2],
                        [2, 2, 2, 2]])
     assert b.n_out_of_order() == 8
+
+def test_make_move_undo():
+    b = Board(GRID_SIZE, PROB_2)
+    grid = np.array([[2, 2, 4, 2],
+                     [2, 2, 2, 2],
+                     [4, 64, 1, 2],
+                     [1, 64, 128, 2]])
+    b.grid = grid.copy()
+    b.score = 10
+    first = b.make_move("down")
+    assert b.score == 10 + 4 + 128 + 4 + 4 + 4
+    second = b.make_move("left")
+    tile = b.place_tile((0, 3), 4)
+    assert b.grid[0, 3] == 4
+    b.undo(tile)
+    assert b.grid[0, 3] == 1
+    b.undo(second)
+    b.undo(first)
+    assert np.all(b.grid == grid)
+    assert b.score == 10
+
+def test_undo_takes_back_later_changes():
+    b = Board(GRID_SIZE, PROB_2)
+    grid = b.grid.copy()
+    record = b.save()
+    for i in range(100):
+        moves = b.possible_moves()
+        if moves == []:
+            break
+        b.make_move(moves[0])
+        b.add_random_tile()
+    b.undo(record)
+    assert np.all(b.grid == grid)
+    assert b.score == 0
+
+def test_from_grid():
+    grid = np.array([[2, 1, 1, 1],
+                     [1, 1, 1, 1],
+                     [1, 1, 1, 1],
+                     [1, 1, 1, 4]])
+    b = Board.from_grid(grid, score=8)
+    assert np.all(b.grid == grid)
+    assert b.score == 8
+    assert b.grid is not grid
+
+def test_legal_moves_cache():
+    b = Board.from_grid(np.array([[1, 1, 1, 2],
+                                  [1, 1, 1, 2],
+                                  [1, 1, 1, 2],
+                                  [1, 1, 1, 2]]))
+    assert b.legal_moves() == (True, False, True, True)
+    assert b.legal_moves() is b.legal_moves()
+    # changes in place and new grids are both seen
+    b.grid[:, 3] = 1
+    b.grid[:, 0] = 2
+    assert b.possible_moves() == ["right", "up", "down"]
+    b.grid = np.array([[2, 4, 2, 4],
+                       [4, 2, 4, 2],
+                       [2, 4, 2, 4],
+                       [4, 2, 4, 2]], dtype=float)
+    assert b.possible_moves() == []
+    assert b.game_over
+    b.grid[0, 0] = 1
+    assert not b.game_over
+    b.place_tile((0, 0), 2)
+    assert b.game_over
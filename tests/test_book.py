@@ -0,0 +1,57 @@
+import numpy as np
+from py2048 import bitboard
+from py2048.board import Board, DIRS
+from py2048.book import Book, board_key, build_book, harvest, opening_keys
+from py2048.players import ExpectimaxPlayer
+
+GRID = np.array([[2, 4, 8, 16],
+                 [4, 2, 1, 1],
+                 [2, 1, 1, 1],
+                 [1, 1, 1, 1]], dtype=float)
+
+
+def test_symmetries():
+    rng = np.random.default_rng(0)
+    for t in range(50):
+        e = rng.integers(0, 6, size=(4, 4))
+        board = bitboard.to_bitboard(np.where(e == 0, 1, 2.0 ** e))
+        key, s = bitboard.canonical(board)
+        assert all(bitboard.canonical(bitboard.symmetry(board, r))[0] == key
+                   for r in range(bitboard.N_SYMMETRIES))
+        for d in DIRS:
+            # the canonical move taken back through the symmetry is the
+            # same move on the original board
+            moved = bitboard.move(key, bitboard.symmetry_move(d, s))[0]
+            assert moved == bitboard.symmetry(bitboard.move(board, d)[0], s)
+    openings = opening_keys()
+    assert len(openings) < 16 * 15 // 2 * 3
+    for seed in range(20):
+        board = board_key(Board(seed=seed).grid)
+        assert bitboard.canonical(board)[0] in openings
+
+
+def test_book_matches_search(tmp_path):
+    path = str(tmp_path / "book.bin")
+    grids = [np.rot90(GRID, k) for k in range(4)] + [GRID.T, np.fliplr(GRID)]
+    keys = set(bitboard.canonical(board_key(g))[0] for g in grids)
+    assert len(keys) == 1
+    counts = harvest({"player": "Player"}, 2, max_moves=5, workers=2)
+    keys |= set(counts)
+    assert build_book(path, keys, 1, workers=2) == len(keys)
+
+    book = Book(path)
+    assert len(book) == len(keys)
+    assert np.all(np.diff(book.keys.astype(float)) > 0)
+    for grid in grids:
+        p = ExpectimaxPlayer(1)
+        p.b = Board.from_grid(grid)
+        scores = p.search_root(1)
+        d, value = book.lookup(grid)
+        assert d == p.b.possible_moves()[scores.index(max(scores))]
+        assert np.isclose(value, max(scores))
+
+        p = ExpectimaxPlayer(2, book=path)
+        p.b = Board.from_grid(grid)
+        assert p.next_move() == d
+        assert p.nodes_searched == 0
+    assert book.lookup(np.full((4, 4), 2.0)) is None
@@ -0,0 +1,57 @@
+import numpy as np
+from py2048.batch import BoardBatch
+from py2048.env import VecEnv
+
+
+def random_actions(legal, rng):
+    keys = np.where(legal, rng.random(legal.shape), -1)
+    return np.argmax(keys, axis=1)
+
+
+def test_step_reuses_buffers_and_rewards_score():
+    env = VecEnv(64, seed=0)
+    obs, legal = env.reset(seed=1)
+    assert obs.dtype == np.uint8 and obs.shape == (64, 4, 4)
+    assert np.all((obs > 0).sum(axis=(1, 2)) == 2)
+    rng = np.random.default_rng(2)
+    total = np.zeros(64, dtype=np.int64)
+    for t in range(20):
+        before = obs.copy()
+        new_obs, rewards, done, new_legal = env.step(random_actions(legal, rng))
+        assert new_obs is obs and new_legal is legal
+        assert not done.any()
+        total += rewards
+        assert np.all((new_obs != before).any(axis=(1, 2)))
+    assert np.all(total == env.batch.score)
+    assert np.all(env.episode_lengths == 20)
+
+
+def test_auto_reset():
+    env = VecEnv(32, seed=3)
+    obs, legal = env.reset()
+    rng = np.random.default_rng(4)
+    finished = 0
+    for t in range(3000):
+        obs, rewards, done, legal = env.step(random_actions(legal, rng))
+        if done.any():
+            finished += done.sum()
+            final = BoardBatch.from_grids(np.ones((done.sum(), 4, 4)))
+            final.exponents = env.final_observations[done]
+            assert final.check_game_over().all()
+            assert np.all(env.final_scores[done] > 0)
+            assert np.all((obs[done] > 0).sum(axis=(1, 2)) == 2)
+            assert np.all(env.batch.score[done] == 0)
+            assert legal[done].any(axis=1).all()
+        if finished >= 32:
+            break
+    assert finished >= 32
+
+
+def test_seeded_reset_repeats():
+    a = VecEnv(8)
+    b = VecEnv(8)
+    obs_a, legal = a.reset(seed=5)
+    obs_b, _ = b.reset(seed=5)
+    assert np.all(obs_a == obs_b)
+    actions = np.argmax(legal, axis=1)
+    assert np.all(a.step(actions)[0] == b.step(actions)[0])
@@ -0,0 +1,57 @@
+import numpy as np
+from py2048.board import Board
+from py2048 import tables
+from py2048.evaluation import Evaluator, line_heuristics
+from py2048.players import ExpectimaxPlayer, DEFAULT_H_WEIGHTS, DEFAULT_H_EXP
+from tests.helpers import random_grids
+
+
+def grid_value(grid, score, h_weights, h_exp):
+    b = Board.from_grid(grid, score)
+    h = np.array([b.smoothness(), b.n_empty_tiles(), b.n_out_of_order(),
+                  b.score])
+    return h_weights.dot(h**h_exp)
+
+
+def test_line_heuristics():
+    t = line_heuristics()
+    line = tables.pack_rows([1, 0, 3, 2])
+    assert np.isclose(t.smoothness[line], 3 * np.log(2))
+    assert t.empty[line] == 1
+    assert t.increasing[line] == 2
+    assert t.decreasing[line] == 1
+
+
+def test_evaluator_matches_heuristics():
+    weights = [(np.array([-0.1, 40, -1, 1]), np.array([1, 0.5, 1, 1])),
+               (np.array([-2.0, 3, -0.5, 0.1]), np.array([2, 1, 1.5, 0.5]))]
+    grids = random_grids(100, max_exponent=11, blank=0.4)
+    for h_weights, h_exp in weights:
+        ev = Evaluator(h_weights, h_exp)
+        for k, grid in enumerate(grids):
+            exponents = tables.cell_exponents(grid)
+            assert np.isclose(ev.evaluate(exponents, 4 * k),
+                              grid_value(grid, 4 * k, h_weights, h_exp))
+
+
+def test_player_rebuilds_evaluator():
+    p = ExpectimaxPlayer(1)
+    grid = random_grids(1, max_exponent=11, blank=0.4)[0]
+    p.b = Board.from_grid(grid, 100)
+    first = p.evaluate_board()
+    p.h_weights = np.array([1.0, 1, 1, 1])
+    assert np.isclose(p.evaluate_board(),
+                      grid_value(grid, 100, p.h_weights, p.h_exp))
+    p.h_weights[0] = 2.0
+    assert p.evaluator().matches(p.h_weights, p.h_exp)
+    assert np.isclose(p.evaluate_board(),
+                      grid_value(grid, 100, p.h_weights, p.h_exp))
+    assert first != p.evaluate_board()
+
+
+def test_weights_are_copied():
+    p = ExpectimaxPlayer(1)
+    p.h_weights[0] = 99
+    p.h_exp[0] = 99
+    assert DEFAULT_H_WEIGHTS[0] != 99 and DEFAULT_H_EXP[0] != 99
+    assert ExpectimaxPlayer(1).h_weights[0] != 99
@@ -0,0 +1,41 @@
+import pickle
+import numpy as np
+from py2048.board import Board
+from py2048.expgrid import ExpGrid
+from tests.helpers import random_grids
+
+
+def test_round_trip():
+    for size in [(4, 4), (3, 3), (6, 6), (3, 5)]:
+        grid = random_grids(1, size, max_exponent=11, blank=0.4)[0]
+        e = ExpGrid.from_grid(grid)
+        assert e.exponents.dtype == np.uint8
+        assert e.shape == size
+        assert np.all(e.to_grid() == grid)
+        assert e.exponents.nbytes * 8 == grid.nbytes
+        assert e.n_empty_tiles() == np.sum(grid == 1)
+        assert e.max_tile() == grid.max()
+        b = Board.from_grid(e, score=4)
+        assert np.all(b.grid == grid)
+        assert b.exp_grid() == e
+
+
+def test_key_and_copy():
+    grid = random_grids(1, (5, 5), max_exponent=11, blank=0.4)[0]
+    e = ExpGrid.from_grid(grid)
+    f = e.copy()
+    assert f == e and hash(f) == hash(e)
+    assert len({e.key(), f.key()}) == 1
+    f.exponents[0, 0] += 1
+    assert f != e
+    assert ExpGrid.empty((2, 8)).key() != ExpGrid.empty((4, 4)).key()
+    assert ExpGrid.empty((1, 300)).key() != ExpGrid.empty((300, 1)).key()
+    assert pickle.loads(pickle.dumps(e)) == e
+
+
+def test_smoothness():
+    for size in [(4, 4), (6, 6)]:
+        grid = random_grids(1, size, max_exponent=11, blank=0.4,
+                           seed=3)[0]
+        b = Board.from_grid(grid)
+        assert np.isclose(ExpGrid.from_grid(grid).smoothness(), b.smoothness())
@@ -0,0 +1,57 @@
+import numpy as np
+from py2048.board import Board
+from py2048 import heuristics, tables
+from py2048.evaluation import line_heuristics
+from tests.helpers import random_grids
+
+
+def test_stack_matches_single_grids():
+    for size in [(3, 3), (5, 5), (3, 5)]:
+        grids = random_grids(20, size, max_exponent=8, blank=0.4)
+        smooth = heuristics.smoothness(grids)
+        order = heuristics.n_out_of_order(grids)
+        merges = heuristics.n_merges_available(grids)
+        assert smooth.shape == order.shape == merges.shape == (20,)
+        for k, grid in enumerate(grids):
+            assert smooth[k] == heuristics.smoothness(grid)
+            assert order[k] == heuristics.n_out_of_order(grid)
+            assert merges[k] == heuristics.n_merges_available(grid)
+    stacked = random_grids(12, max_exponent=8, blank=0.4).reshape(3, 4, 4, 4)
+    assert heuristics.smoothness(stacked).shape == (3, 4)
+
+
+def test_5x5_values():
+    grid = np.array([[2, 2, 2, 1, 2],
+                     [4, 1, 1, 1, 1],
+                     [8, 1, 1, 1, 1],
+                     [1, 1, 1, 1, 1],
+                     [16, 1, 1, 1, 1]])
+    assert heuristics.n_merges_available(grid) == 2
+    assert np.isclose(heuristics.smoothness(grid), 3 * np.log(2))
+    assert heuristics.n_out_of_order(grid) == 0
+    grid[0, 4] = 4
+    assert heuristics.n_merges_available(grid) == 1
+    assert heuristics.n_out_of_order(grid) == 0
+    grid[0, 0] = 8
+    assert heuristics.n_out_of_order(grid) == 3
+
+
+def test_4x4_matches_tables():
+    t = line_heuristics()
+    for grid in random_grids(100, max_exponent=8, blank=0.4):
+        exponents = tables.cell_exponents(grid)
+        lines = tables.row_codes(exponents) + tables.col_codes(exponents)
+        assert np.isclose(heuristics.smoothness(grid),
+                          sum(t.smoothness[code] for code in lines))
+        b = Board.from_grid(grid)
+        assert heuristics.n_merges_available(grid) == b.n_merges_available()
+
+
+def test_board_heuristics_do_not_change_board():
+    grid = random_grids(1, (5, 5), max_exponent=8, blank=0.4)[0]
+    b = Board.from_grid(grid, score=12)
+    b.n_merges_available()
+    b.smoothness()
+    b.n_out_of_order()
+    assert np.all(b.grid == grid)
+    assert b.score == 12
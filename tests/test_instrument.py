@@ -0,0 +1,84 @@
+import json
+import sys
+import tracemalloc
+
+import pytest
+from py2048.board import Board
+from py2048.evaluation import Evaluator
+from py2048.instrument import (Instrument, LatencyHistogram,
+                               HEURISTIC_METHODS, LATENCY_EDGES)
+from py2048.players import ExpectimaxPlayer, MCPlayer
+
+
+def test_move_stats_and_export(tmp_path):
+    inst = Instrument(count_calls=HEURISTIC_METHODS, profile=True,
+                      trace_memory=True, profile_top=5)
+    p = ExpectimaxPlayer(1, tt_size=1000)
+    result = p.play(max_moves=10, instrument=inst)
+    game = inst.games[0]
+    assert game["result"] == result
+    assert len(game["moves"]) == 10
+    assert all(m["search"]["nodes"] > 0 for m in game["moves"])
+    assert game["latency"]["count"] == 10
+    assert sum(game["latency"]["counts"]) == 10
+    assert len(game["profile"]) == 5
+    assert game["memory"]["peak"] > 0
+    # 4x4 leaves are evaluated with the tables
+    assert game["calls"]["Evaluator.evaluate"]["calls"] > 0
+    assert game["calls"]["Evaluator.evaluate"]["seconds"] > 0
+    assert game["calls"]["Board.n_empty_tiles"]["calls"] > 0
+    # the methods are put back after the game
+    assert Board.n_empty_tiles.__qualname__ == "Board.n_empty_tiles"
+    assert not hasattr(Board.n_empty_tiles, "__wrapped__")
+    assert not hasattr(Evaluator.evaluate, "__wrapped__")
+
+    path = str(tmp_path / "stats.json")
+    inst.save(path)
+    with open(path) as f:
+        saved = json.load(f)
+    assert saved["latency"]["count"] == 10
+
+
+def test_own_calls_not_counted():
+    inst = Instrument(count_calls=["n_empty_tiles"])
+    p = MCPlayer(1, 1)
+    p.play(max_moves=5, instrument=inst)
+    # MCPlayer never asks for the empty tiles, only record_move reads them
+    assert inst.games[0]["calls"]["n_empty_tiles"]["calls"] == 0
+
+
+def test_cleanup_when_a_move_raises():
+    inst = Instrument(count_calls=HEURISTIC_METHODS, profile=True,
+                      trace_memory=True)
+    p = ExpectimaxPlayer(1)
+
+    def broken():
+        raise ValueError("broken")
+
+    p.next_move = broken
+    with pytest.raises(ValueError):
+        p.play(instrument=inst)
+    assert not hasattr(Board.n_empty_tiles, "__wrapped__")
+    assert not hasattr(Evaluator.evaluate, "__wrapped__")
+    assert sys.getprofile() is None
+    assert not tracemalloc.is_tracing()
+    assert inst.games == []
+
+
+def test_rollout_steps():
+    inst = Instrument()
+    p = MCPlayer(5, 4)
+    p.play(max_moves=3, instrument=inst)
+    for m in inst.games[0]["moves"]:
+        assert 0 < m["search"]["rollout_steps"] <= 5 * 4 * 4
+    assert "profile" not in inst.games[0]
+
+
+def test_latency_histogram():
+    h = LatencyHistogram()
+    for seconds in [1e-6, 3e-6, 3e-6, 1.0]:
+        h.add(seconds)
+    assert h.count == 4 and h.min == 1e-6 and h.max == 1.0
+    assert h.counts[0] == 1 and h.counts[2] == 2
+    assert h.quantile(0.5) == LATENCY_EDGES[2]
+    assert h.quantile(1.0) == 1.0
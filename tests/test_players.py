@@ -0,0 +1,278 @@
+import numpy as np
+from py2048 import bitboard, players
+from py2048.board import DIRS
+from py2048.players import ExpectimaxPlayer, MCPlayer, MCTSPlayer
+
+GRIDS = [np.array([[2, 4, 8, 16],
+                   [4, 2, 1, 1],
+                   [2, 1, 1, 1],
+                   [1, 1, 1, 1]], dtype=float),
+         np.array([[2, 4, 8, 16],
+                   [32, 16, 8, 4],
+                   [2, 4, 2, 2],
+                   [1, 2, 1, 4]], dtype=float)]
+
+
+def set_board(p, grid, score=100):
+    p.b.grid = grid.copy()
+    p.b.score = score
+
+
+def test_transposition_table_matches_search():
+    plain = ExpectimaxPlayer(1)
+    cached = ExpectimaxPlayer(1, tt_size=1000)
+    for grid in GRIDS:
+        for depth in [1, 2]:
+            set_board(plain, grid)
+            set_board(cached, grid)
+            assert (plain.expectimax("move", depth) ==
+                    cached.expectimax("move", depth))
+            assert np.all(cached.b.grid == grid)
+        set_board(plain, grid)
+        set_board(cached, grid)
+        assert plain.next_move() == cached.next_move()
+    assert cached.tt.hits > 0
+
+
+def test_transposition_table_bounded():
+    p = ExpectimaxPlayer(1, tt_size=50)
+    set_board(p, GRIDS[0])
+    p.expectimax("move", 2)
+    assert len(p.tt) == 50
+    assert p.tt.evictions > 0
+
+
+def test_reuse_tree_keeps_the_subtree_of_the_real_move():
+    p = ExpectimaxPlayer(2, tt_size=100000, reuse_tree=True)
+    set_board(p, GRIDS[0])
+    d = p.next_move()
+    p.b.move(d)
+    p.b.place_tile(p.b.empty_tiles()[0], 2)
+
+    # the new root was searched one turn shallower, so the values of
+    # its moves are all in the table
+    p.nodes_searched = 0
+    hits = p.tt.hits
+    scores = p.search_root(1)
+    assert p.tt.hits - hits == len(scores) == p.nodes_searched
+    fresh = ExpectimaxPlayer(1)
+    set_board(fresh, p.b.grid, p.b.score)
+    assert scores == fresh.search_root(1)
+
+    fresh = ExpectimaxPlayer(2)
+    set_board(fresh, p.b.grid, p.b.score)
+    assert p.next_move() == fresh.next_move()
+
+
+def count_evaluations(p, turn, depth):
+    calls = []
+    evaluate = p.evaluate_board
+
+    def counting():
+        calls.append(1)
+        return evaluate()
+
+    p.evaluate_board = counting
+    value = p.expectimax(turn, depth)
+    del p.evaluate_board
+    return value, len(calls)
+
+
+def test_chance_node_is_normalized():
+    p = ExpectimaxPlayer(1)
+    set_board(p, GRIDS[0])
+    expected = 0
+    cells = p.b.empty_tiles()
+    for i in cells:
+        for tile, prob in [(2, 0.9), (4, 0.1)]:
+            p.b.grid[i] = tile
+            expected += prob * p.evaluate_board() / len(cells)
+            p.b.grid[i] = 1
+    assert np.isclose(p.expectimax("add", 1), expected)
+
+
+def test_prob_cutoff_prunes_chance_nodes():
+    exact = ExpectimaxPlayer(1)
+    cutoff = ExpectimaxPlayer(1, prob_cutoff=0.05)
+    set_board(exact, GRIDS[0])
+    set_board(cutoff, GRIDS[0])
+    _, n_exact = count_evaluations(exact, "add", 2)
+    _, n_cutoff = count_evaluations(cutoff, "add", 2)
+    assert n_cutoff < n_exact
+    # a cutoff that never triggers gives the exact value
+    never = ExpectimaxPlayer(1, prob_cutoff=1e-12)
+    set_board(never, GRIDS[0])
+    assert never.expectimax("add", 2) == exact.expectimax("add", 2)
+
+
+def test_max_cells_samples_empty_tiles():
+    p = ExpectimaxPlayer(1, max_cells=3, seed=0)
+    set_board(p, GRIDS[0])
+    _, n = count_evaluations(p, "add", 1)
+    assert n == 3 * 2
+    assert np.all(p.b.grid == GRIDS[0])
+
+
+def test_time_limit_deepens_until_deadline():
+    p = ExpectimaxPlayer(1, time_limit=1.0)
+    set_board(p, GRIDS[1])
+    d = p.next_move()
+    assert d in p.b.possible_moves()
+    assert p.depth_reached >= 2
+    assert p.nodes_searched > 0
+    assert p.search_time < 2.0
+    assert np.all(p.b.grid == GRIDS[1])
+
+
+def test_time_limit_matches_fixed_depth():
+    fixed = ExpectimaxPlayer(1)
+    timed = ExpectimaxPlayer(1, time_limit=0.0)
+    set_board(fixed, GRIDS[0])
+    set_board(timed, GRIDS[0])
+    assert timed.next_move() == ExpectimaxPlayer.next_move(fixed)
+    assert timed.depth_reached == 1
+
+
+def test_reuse_tree_deepens_at_least_as_far(monkeypatch):
+    # cap the deepening so every search ends by depth, not by time
+    monkeypatch.setattr(players, "MAX_ITERATIVE_DEPTH", 3)
+    reuse = ExpectimaxPlayer(1, tt_size=100000, reuse_tree=True,
+                             time_limit=60.0)
+    set_board(reuse, GRIDS[1])
+    for move in range(3):
+        fresh = ExpectimaxPlayer(1, tt_size=100000, time_limit=60.0)
+        set_board(fresh, reuse.b.grid, reuse.b.score)
+        fresh.next_move()
+        d = reuse.next_move()
+        assert reuse.depth_reached >= fresh.depth_reached == 3
+        reuse.b.move(d)
+        reuse.b.place_tile(reuse.b.empty_tiles()[0], 2)
+
+
+def test_parallel_root_search_matches_serial():
+    serial = ExpectimaxPlayer(1, tt_size=1000)
+    parallel = ExpectimaxPlayer(1, tt_size=1000, workers=2)
+    split = ExpectimaxPlayer(1, workers=2, split_chance=True)
+    try:
+        for grid in GRIDS:
+            for p in [serial, parallel, split]:
+                set_board(p, grid)
+            scores = serial.search_root(2)
+            assert parallel.search_root(2) == scores
+            assert split.search_root(2) == scores
+            assert parallel.next_move() == serial.next_move()
+            assert np.all(parallel.b.grid == grid)
+        assert split.nodes_searched > 0
+    finally:
+        parallel.close()
+        split.close()
+
+
+def test_parallel_max_cells_matches_serial():
+    serial = ExpectimaxPlayer(1, max_cells=3, seed=0)
+    set_board(serial, GRIDS[0])
+    expected = serial.search_root(2)
+    for split_chance in [False, True]:
+        parallel = ExpectimaxPlayer(1, max_cells=3, seed=0, workers=2,
+                                    split_chance=split_chance)
+        try:
+            set_board(parallel, GRIDS[0])
+            assert parallel.search_root(2) == expected
+            assert parallel.search_root(2) == expected
+        finally:
+            parallel.close()
+
+
+def test_default_seed_follows_np_random():
+    seeds = []
+    for k in range(2):
+        np.random.seed(3)
+        p = ExpectimaxPlayer(1, max_cells=2)
+        set_board(p, GRIDS[0])
+        p.next_move()
+        seeds.append(p.seed)
+    assert seeds[0] == seeds[1]
+
+
+def test_parallel_time_limit():
+    # tasks waiting in the queue share the move's deadline
+    p = ExpectimaxPlayer(1, time_limit=0.3, workers=2, split_chance=True)
+    try:
+        for k in range(2):
+            set_board(p, GRIDS[0])
+            assert p.next_move() in p.b.possible_moves()
+            assert p.search_time < 0.6
+    finally:
+        p.close()
+
+
+def test_sharded_rollouts_independent_of_workers():
+    scores = []
+    moves = []
+    for workers in [1, 3]:
+        p = MCPlayer(5, 40, workers=workers, seed=7, shard_size=8)
+        set_board(p, GRIDS[0])
+        try:
+            scores.append(p.sharded_scores())
+            moves.append(p.next_move())
+        finally:
+            p.close()
+    assert scores[0] == scores[1]
+    assert moves[0] == moves[1]
+    assert len(scores[0]) == len(p.b.possible_moves())
+
+
+def test_vectorized_rollouts():
+    p = MCPlayer(10, 200, vectorized=True, seed=1)
+    set_board(p, GRIDS[0])
+    scores = p.batch_scores()
+    assert len(scores) == len(p.b.possible_moves())
+    # every trial scores at least the score of the board
+    assert min(scores) >= 200 * 100
+    p = MCPlayer(10, 200, vectorized=True, seed=1)
+    set_board(p, GRIDS[0])
+    assert p.batch_scores() == scores
+    assert p.next_move() in p.b.possible_moves()
+    assert np.all(p.b.grid == GRIDS[0])
+
+
+def test_mcts_player():
+    p = MCTSPlayer(iterations=200, seed=0)
+    set_board(p, GRIDS[0])
+    d = p.next_move()
+    assert d in p.b.possible_moves()
+    assert p.iterations_run == 200
+    # the first iteration rolls out from the root itself
+    root_visits = sum(p.nodes.visits[k] for k in p.nodes.children(0))
+    assert root_visits + 1 == p.nodes.visits[0] == 200
+
+    # the subtree of a spawn the search has seen is kept
+    chance = next(k for k in p.nodes.children(0)
+                  if p.nodes.label[k] == DIRS.index(d))
+    child = next(p.nodes.children(chance))
+    p.b.grid = bitboard.to_grid(int(p.nodes.board[child]))
+    p.b.score = int(p.nodes.score[child])
+    visits = p.nodes.visits[child]
+    p.next_move()
+    assert p.nodes.visits[0] == visits + 200
+
+    same = MCTSPlayer(iterations=200, seed=0)
+    set_board(same, GRIDS[0])
+    assert same.next_move() == d
+
+
+def test_mcts_memory_cap():
+    p = MCTSPlayer(iterations=500, max_nodes=40, seed=1)
+    set_board(p, GRIDS[1])
+    assert p.next_move() in p.b.possible_moves()
+    assert p.nodes.n == 40
+
+
+def test_mcts_budgets():
+    assert MCTSPlayer().iterations == 1000
+    p = MCTSPlayer(time_limit=0.2, seed=0)
+    set_board(p, GRIDS[1])
+    p.next_move()
+    # the time limit alone decides when the search stops
+    assert p.iterations is None
+    assert p.search_time >= 0.2
@@ -0,0 +1,77 @@
+import os
+import numpy as np
+import pytest
+from py2048.players import Player
+from py2048.records import RecordWriter, RecordReader, index_path
+
+
+class RandomPlayer(Player):
+    def next_move(self):
+        moves = self.b.possible_moves()
+        return moves[np.random.randint(len(moves))]
+
+
+def play_games(path, n):
+    finals = []
+    with RecordWriter(path) as w:
+        for k in range(n):
+            p = RandomPlayer()
+            result = p.play(recorder=w)
+            result["seed"] = p.b.seed
+            finals.append((p.b.grid.copy(), result))
+    return finals
+
+
+def test_record_and_replay(tmp_path):
+    path = str(tmp_path / "games.rec")
+    finals = play_games(path, 3)
+    r = RecordReader(path)
+    assert len(r) == 3
+    for k, (grid, result) in enumerate(finals):
+        assert r.n_turns(k) == result["moves"]
+        assert r.seed(k) == result["seed"]
+        b = r.position(k)
+        assert np.all(b.grid == grid)
+        assert b.score == result["score"]
+        assert b.game_over
+    start = r.position(0, 0)
+    assert start.n_empty_tiles() == 14
+    moves, spawns = r.turns(0)
+    assert len(moves) == len(spawns) == finals[0][1]["moves"]
+    # one byte per turn plus the headers
+    size = os.path.getsize(path)
+    assert size == 8 + sum(13 + 2 + result["moves"] for _, result in finals)
+
+
+def test_append_and_drop_partial_game(tmp_path):
+    path = str(tmp_path / "games.rec")
+    play_games(path, 2)
+    # a game that was being written when the writer stopped
+    with open(path, "ab") as f:
+        f.write(b"\x01\x02\x03")
+    finals = play_games(path, 1)
+    r = RecordReader(path)
+    assert len(r) == 3
+    assert np.all(r.position(2).grid == finals[0][0])
+    assert os.path.getsize(index_path(path)) == 3 * 8
+
+
+def test_rebuild_lost_index(tmp_path):
+    path = str(tmp_path / "games.rec")
+    finals = play_games(path, 3)
+    os.remove(index_path(path))
+    with open(path, "ab") as f:
+        f.write(b"\x01\x02\x03")
+    finals += play_games(path, 1)
+    r = RecordReader(path)
+    assert len(r) == 4
+    for k, (grid, result) in enumerate(finals):
+        assert np.all(r.position(k).grid == grid)
+
+    other = str(tmp_path / "other.bin")
+    with open(other, "wb") as f:
+        f.write(b"not a record file")
+    with pytest.raises(Exception):
+        RecordWriter(other)
+    with open(other, "rb") as f:
+        assert f.read() == b"not a record file"
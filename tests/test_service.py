@@ -0,0 +1,53 @@
+import asyncio
+import numpy as np
+from py2048.board import Board
+from py2048.players import ExpectimaxPlayer
+from py2048 import service
+
+CONFIG = {"player": "ExpectimaxPlayer", "kwargs": {"depth": 1}}
+
+
+def test_in_process_batches_sessions():
+    async def run():
+        async with service.GameService(CONFIG, workers=2,
+                                       max_wait=0.05) as api:
+            stats = await service.load_test(api, 8, 3)
+            assert api.n_requests == stats["turns"] == 24
+            assert api.n_batches < api.n_requests
+            assert api.sessions == {}
+
+            # the moves are the player's moves and the tiles follow the seed
+            game = await api.create_game(seed=4)
+            state = await api.step(game)
+            b = Board(seed=4)
+            p = ExpectimaxPlayer(1)
+            p.b = Board.from_grid(b.grid)
+            b.turn(p.next_move())
+            assert np.all(np.array(state["grid"]) == b.grid)
+            assert state["score"] == b.score
+    asyncio.run(run())
+
+
+def test_socket_api():
+    async def run():
+        async with service.GameService(CONFIG, workers=2) as api:
+            server = await service.serve(api, port=0)
+            port = server.sockets[0].getsockname()[1]
+            async with service.ServiceClient(port=port) as client:
+                stats = await service.load_test(client, 4, 2)
+                assert stats["turns"] == 8
+
+                game = await client.create_game(seed=1)
+                state = await client.step(game, "left")
+                assert state["moves"] == 1
+                state = await client.play(game, max_moves=3)
+                assert state["moves"] == 3
+                try:
+                    await client.step(game, "sideways")
+                    assert False
+                except Exception as e:
+                    assert "Illegal move" in str(e)
+                assert (await client.close_game(game))["game"] == game
+            server.close()
+            await server.wait_closed()
+    asyncio.run(run())
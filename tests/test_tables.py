@@ -0,0 +1,55 @@
+import numpy as np
+from py2048.board import Board, DIRS
+from py2048 import tables
+from tests.helpers import random_grids
+
+
+def loop_board(monkeypatch):
+    """A Board whose methods skip the row tables"""
+    monkeypatch.setattr(tables, "cell_exponents", lambda grid: None)
+    return Board()
+
+
+def test_pack_unpack_rows():
+    codes = np.arange(tables.N_ROWS)
+    assert np.all(tables.pack_rows(tables.unpack_rows(codes)) == codes)
+
+
+def test_row_tables():
+    t = tables.row_tables()
+    row = tables.pack_rows([1, 1, 2, 0])
+    assert t.left[row] == tables.pack_rows([2, 2, 0, 0])
+    assert t.right[row] == tables.pack_rows([0, 0, 2, 2])
+    assert t.score[row] == 4
+    assert t.merges[row] == 1
+    row = tables.pack_rows([1, 2, 3, 4])
+    assert not t.changed_left[row] and not t.changed_right[row]
+    row = tables.pack_rows([15, 15, 0, 0])
+    assert t.left[row] == row
+
+
+def test_table_results_match_loops(monkeypatch):
+    grids = random_grids(200)
+    fast = Board()
+    results = []
+    for grid in grids:
+        fast.grid = grid.copy()
+        row = [fast.possible_moves(), fast.n_merges_available()]
+        for d in DIRS:
+            fast.grid = grid.copy()
+            fast.score = 0
+            fast.move(d)
+            row.append((fast.grid.copy(), fast.score))
+        results.append(row)
+
+    slow = loop_board(monkeypatch)
+    for grid, row in zip(grids, results):
+        slow.grid = grid.copy()
+        assert slow.possible_moves() == row[0]
+        assert slow.n_merges_available() == row[1]
+        for d, (fast_grid, fast_score) in zip(DIRS, row[2:]):
+            slow.grid = grid.copy()
+            slow.score = 0
+            slow.move(d)
+            assert np.all(slow.grid == fast_grid)
+            assert slow.score == fast_score
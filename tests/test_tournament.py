@@ -0,0 +1,41 @@
+import json
+from py2048 import tournament
+
+CONFIG = {"player": "Player"}
+
+
+def read_lines(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_tournament_streams_and_resumes(tmp_path):
+    path = str(tmp_path / "results.jsonl")
+    results = tournament.run_tournament(CONFIG, 4, path, seed=3, workers=2)
+    assert [r["game"] for r in results] == [0, 1, 2, 3]
+    assert len(read_lines(path)) == 4
+    assert all(r["moves"] > 0 and r["max_tile"] >= 4 for r in results)
+
+    # cut the last game short, as if the run was interrupted
+    with open(path) as f:
+        lines = f.readlines()
+    with open(path, "w") as f:
+        f.writelines(lines[:2])
+        f.write(lines[2][:10])
+
+    resumed = tournament.run_tournament(CONFIG, 6, path, seed=3, workers=2)
+    assert len(read_lines(path)) == 6
+    for old, new in zip(results, resumed):
+        assert old["score"] == new["score"]
+        assert old["seed"] == new["seed"]
+
+    # nothing left to play
+    tournament.run_tournament(CONFIG, 6, path, seed=3, workers=2)
+    assert len(read_lines(path)) == 6
+
+
+def test_games_are_seeded():
+    a = tournament.play_game(CONFIG, 0, 5)
+    b = tournament.play_game(CONFIG, 0, 5)
+    assert a["score"] == b["score"] and a["moves"] == b["moves"]
+    assert tournament.game_seed(0, 1) != tournament.game_seed(0, 2)
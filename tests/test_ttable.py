@@ -0,0 +1,32 @@
+from py2048.ttable import TranspositionTable
+
+
+def test_get_put():
+    tt = TranspositionTable(10)
+    assert tt.get("a") is None
+    tt.put("a", 1.5)
+    assert tt.get("a") == 1.5
+    assert "a" in tt
+    assert tt.hits == 1 and tt.misses == 1
+    assert tt.hit_rate() == 0.5
+
+
+def test_lru_eviction():
+    tt = TranspositionTable(2, "lru")
+    tt.put("a", 1)
+    tt.put("b", 2)
+    tt.get("a")
+    tt.put("c", 3)
+    assert "a" in tt and "c" in tt and "b" not in tt
+    assert tt.evictions == 1
+    assert len(tt) == 2
+
+
+def test_fifo_eviction():
+    tt = TranspositionTable(2, "fifo")
+    tt.put("a", 1)
+    tt.put("b", 2)
+    tt.get("a")
+    tt.put("c", 3)
+    assert "b" in tt and "c" in tt and "a" not in tt
+
@@ -0,0 +1,34 @@
+import json
+import numpy as np
+from py2048 import tuner
+
+SETTINGS = dict(population=2, n_games=2, max_moves=5, seed=1, workers=2)
+
+
+def test_tune_improves_or_keeps_best(tmp_path):
+    state = tuner.tune(2, **SETTINGS)
+    assert state["generation"] == 2
+    assert len(state["history"]) == 2
+    best = state["best"]
+    assert len(best["h_weights"]) == len(best["h_exp"]) == 4
+    assert len(best["scores"]) == 2
+    assert best["score"] == np.mean(best["scores"])
+    assert best["score"] >= max(max(h["mean_scores"]) for h in state["history"])
+
+
+def test_checkpoint_resumes_to_the_same_result(tmp_path):
+    path = str(tmp_path / "tune.json")
+    tuner.tune(1, checkpoint=path, **SETTINGS)
+    with open(path) as f:
+        assert json.load(f)["generation"] == 1
+    resumed = tuner.tune(2, checkpoint=path, **SETTINGS)
+    straight = tuner.tune(2, **SETTINGS)
+    assert resumed["best"] == straight["best"]
+    assert resumed["history"] == straight["history"]
+
+
+def test_perturb_keeps_signs():
+    rng = np.random.default_rng(0)
+    params = np.array([-0.1, 40, -1, 1, 1, 0.5, 1, 1])
+    for k in range(10):
+        assert np.all(np.sign(tuner.perturb(params, 0.5, rng)) == np.sign(params))